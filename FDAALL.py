@@ -0,0 +1,24 @@
+# FDAALL.py – รวมรอบ BRANDS + OPERATORS เป็น crawl เดียว (รายละเอียดของเลขจดแจ้งที่ซ้ำกันดึงครั้งเดียว)
+# -*- coding: utf-8 -*-
+# เอาต์พุต: BRAND__<ยี่ห้อ>.csv + <ผู้ประกอบการ>.csv ในโฟลเดอร์เดียว และรายงาน new_changes_<วันที่>.csv ชุดเดียว
+import time
+import multiprocessing as mp
+
+import fda_engine
+from FDABrands import BRANDS
+from FDAOPERATORS import OPERATORS
+
+WORKERS = 1
+
+def main(headless=True, outdir="output_csv", workers=None, resume=False):
+    queries = [("brand", b) for b in BRANDS] + [("operator", op) for op in OPERATORS]
+    fda_engine.run(queries, headless=headless, outdir=outdir, workers=WORKERS if workers is None else workers, resume=resume)
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resume", action="store_true", help="ทำต่อจาก <outdir>/_journal.jsonl ของรอบที่ค้าง (timeout/crash)")
+    args = ap.parse_args()
+    main(headless=True, workers=WORKERS, resume=args.resume)
+    time.sleep(0.2)
@@ -0,0 +1,117 @@
+# baseline_store.py – baseline แบบ columnar: Parquet dataset เดียวแบ่ง partition ตาม source (ชื่อไฟล์ CSV เดิม)
+# -*- coding: utf-8 -*-
+# แทนการ parse CSV 157 ไฟล์ซ้ำหลายที่ – อ่านแบรนด์เดียวด้วย filter (partition pruning) / อ่านเฉพาะคอลัมน์ที่ใช้
+#   python baseline_store.py import                # baseline/*.csv -> baseline/_store/
+#   python baseline_store.py export --out baseline # baseline/_store/ -> CSV (utf-8-sig) เหมือนเดิม
+import os, json, shutil, argparse, tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+STORE_NAME = "_store"
+MANIFEST = "_sources.json"  # {source: [คอลัมน์ตามลำดับใน CSV]} – เก็บ source ที่ไม่มีแถว/ลำดับคอลัมน์ไว้ export คืน
+SOURCE_COL = "source"
+
+def store_dir(base_dir) -> Path:
+    return Path(base_dir) / STORE_NAME
+
+def has_store(base_dir) -> bool:
+    return (store_dir(base_dir) / MANIFEST).is_file()
+
+def load_manifest(store: Path) -> Dict[str, List[str]]:
+    try:
+        with open(store / MANIFEST, "r", encoding="utf-8") as f: return json.load(f)
+    except Exception: return {}
+
+def _save_manifest(store: Path, man: Dict[str, List[str]]):
+    """เขียนผ่านไฟล์ชั่วคราวชื่อไม่ซ้ำแล้ว os.replace (ขึ้นต้น '_' = dataset ไม่อ่าน) – ยังเป็น read-modify-write:
+    ต้องมี writer เดียว (compare_baseline เขียน store ที่ process หลักเท่านั้น)"""
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=store, prefix=MANIFEST + ".", suffix=".tmp", delete=False) as f:
+        json.dump(man, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(f.name, store / MANIFEST)
+
+def _part_dir(store: Path, source: str) -> Path:
+    return store / f"{SOURCE_COL}={source}"  # hive partition ใช้ชื่อตรง ๆ (uri-encode ชื่อไทยยาวเกิน 255 ไบต์) – ชื่อมาจากชื่อไฟล์อยู่แล้ว
+
+def str_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """ทุกคอลัมน์เป็น str แบบเดียวกับ read_csv(dtype=str, keep_default_na=False): ค่าว่าง = "" และ float ที่เป็นจำนวนเต็ม (68.0) = "68" """
+    out = df.copy()
+    for c in out.columns:
+        s = out[c]
+        if pd.api.types.is_float_dtype(s) and (s.dropna() % 1 == 0).all(): s = s.astype("Int64")
+        out[c] = s.astype(object).where(s.notna(), "").astype(str)
+    return out
+
+def write_source(base_dir, source: str, df: pd.DataFrame):
+    """เขียนทับ partition ของ source เดียว (เช่นหลัง compare_baseline --apply)"""
+    store = store_dir(base_dir); store.mkdir(parents=True, exist_ok=True)
+    part = _part_dir(store, source)
+    if part.exists(): shutil.rmtree(part)
+    if len(df):
+        part.mkdir(parents=True)
+        table = pa.Table.from_pandas(df.astype(str), preserve_index=False)
+        pq.write_table(table, part / "part-0.parquet", use_dictionary=True, compression="zstd")  # ข้อความซ้ำเยอะ -> dictionary page
+    man = load_manifest(store); man[source] = [str(c) for c in df.columns]
+    _save_manifest(store, man)
+
+def _dataset(store: Path):
+    """schema จาก manifest (ทุกคอลัมน์เป็น string) – source ที่ไม่มีบางคอลัมน์ได้ null แทนการเดา schema จากไฟล์แรก"""
+    names = list(dict.fromkeys(c for cols in load_manifest(store).values() for c in cols))
+    schema = pa.schema([(c, pa.string()) for c in names] + [(SOURCE_COL, pa.string())])
+    return ds.dataset(store, schema=schema, format="parquet", partitioning=ds.HivePartitioning.discover(segment_encoding="none"))  # ไฟล์ขึ้นต้น '_' (manifest) ถูกข้ามเอง
+
+def read_source(base_dir, source: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """DataFrame (dtype str) ของ source เดียว – ไม่มีใน store = None"""
+    store = store_dir(base_dir)
+    cols = load_manifest(store).get(source)
+    if cols is None: return None
+    want = [c for c in (columns or cols) if c in cols]
+    if not _part_dir(store, source).exists(): return pd.DataFrame(columns=want)
+    table = _dataset(store).to_table(columns=want, filter=ds.field(SOURCE_COL) == source)
+    return str_frame(table.to_pandas())
+
+def read_all(base_dir, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """ทุก source รวมกัน + คอลัมน์ source (columns = อ่านเฉพาะคอลัมน์ที่มีอยู่จริง)"""
+    store = store_dir(base_dir)
+    if not any(store.glob(f"{SOURCE_COL}=*")): return pd.DataFrame(columns=(columns or []) + [SOURCE_COL])
+    dset = _dataset(store)
+    want = None if columns is None else [c for c in columns if c in dset.schema.names] + [SOURCE_COL]
+    return str_frame(dset.to_table(columns=want).to_pandas())
+
+def import_csvs(base_dir) -> int:
+    """baseline/*.csv ทั้งหมด -> store (สร้างใหม่ทั้งก้อน) – คืนจำนวน source"""
+    base_dir = Path(base_dir)
+    store = store_dir(base_dir)
+    if store.exists(): shutil.rmtree(store)
+    n = 0
+    for p in sorted(base_dir.glob("*.csv")):
+        try: df = pd.read_csv(p, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        except pd.errors.EmptyDataError: df = pd.DataFrame()
+        write_source(base_dir, p.stem, df); n += 1
+    return n
+
+def export_csvs(base_dir, out_dir) -> int:
+    """store -> <out_dir>/<source>.csv (utf-8-sig, คอลัมน์ตามลำดับเดิม) – คืนจำนวนไฟล์"""
+    store, out_dir = store_dir(base_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for source, cols in load_manifest(store).items():
+        df = read_source(base_dir, source) if cols else pd.DataFrame()
+        df.to_csv(out_dir / f"{source}.csv", index=False, encoding="utf-8-sig")
+    return len(load_manifest(store))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Import/export the columnar baseline store.")
+    ap.add_argument("cmd", choices=["import", "export"])
+    ap.add_argument("--baseline-dir", default=os.environ.get("FDA_BASELINE_DIR", "baseline"))
+    ap.add_argument("--out", default="baseline_export", help="โฟลเดอร์ปลายทางของ export")
+    args = ap.parse_args()
+    if args.cmd == "import":
+        n = import_csvs(args.baseline_dir)
+        print(f"Imported {n} CSV -> {store_dir(args.baseline_dir)}")
+    else:
+        n = export_csvs(args.baseline_dir, args.out)
+        print(f"Exported {n} CSV -> {args.out}")
@@ -0,0 +1,69 @@
+# bench_compare.py – เทียบเวลา/หน่วยความจำของ diff แบบเดิม (set ของ tuple) กับ diff_rows (hash ต่อแถว + anti-join)
+# -*- coding: utf-8 -*-
+# สร้างแบรนด์จำลองขนาดใหญ่ในหน่วยความจำ ไม่ต้องมีไฟล์ใน baseline/ หรือ incoming/
+#   python bench_compare.py --rows 1000000
+import time, argparse, tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import compare_baseline as cb
+
+COLS = ["ชื่อการค้า", "ชื่อเครื่องสำอาง", "เลขที่ใบรับจดแจ้ง", "ปีที่จดแจ้ง", "ประเภทการจดแจ้ง",
+        "สถานะใบรับจดแจ้ง", "วันที่อนุญาต", "วันที่หมดอายุ", "ชื่อผู้ประกอบการ",
+        "ชื่อและที่อยู่ผู้ผลิตต่างประเทศ", "ชื่อผู้ว่าจ้างผลิต", "เลขอ้างอิงสำหรับ", "SKUs"]
+
+def synth(rows: int, seed: int = 0) -> pd.DataFrame:
+    """แบรนด์จำลอง: เลขจดแจ้งไม่ซ้ำ + คอลัมน์ข้อความที่ค่าซ้ำกันเยอะแบบข้อมูลจริง"""
+    rng = np.random.default_rng(seed)
+    n = np.arange(rows)
+    no = pd.Series(n).map(lambda i: f"{10 + i % 80}-1-68{i:08d}")
+    return pd.DataFrame({
+        COLS[0]: "BIG BRAND " + pd.Series(rng.integers(0, 500, rows)).astype(str),
+        COLS[1]: "PRODUCT " + pd.Series(rng.integers(0, 50000, rows)).astype(str),
+        COLS[2]: no, COLS[3]: "68",
+        COLS[4]: np.where(rng.random(rows) < 0.7, "ผลิต", "นำเข้า"),
+        COLS[5]: "อนุมัติ",
+        COLS[6]: pd.Series(rng.integers(1, 29, rows)).astype(str) + "/1/2568",
+        COLS[7]: pd.Series(rng.integers(1, 29, rows)).astype(str) + "/1/2571",
+        COLS[8]: "บริษัท " + pd.Series(rng.integers(0, 2000, rows)).astype(str) + " จำกัด",
+        COLS[9]: "-", COLS[10]: "", COLS[11]: "U1CM" + no.str.replace("-", ""), COLS[12]: "",
+    })
+
+def legacy_diff(base_df: pd.DataFrame, new_df: pd.DataFrame):
+    base_rows = set(tuple(r) for r in base_df.to_numpy().tolist())
+    new_rows = set(tuple(r) for r in new_df.to_numpy().tolist())
+    added, removed = new_rows - base_rows, base_rows - new_rows
+    return (pd.DataFrame(list(added), columns=base_df.columns),
+            pd.DataFrame(list(removed), columns=base_df.columns), len(new_rows & base_rows))
+
+def measure(fn, *args):
+    """จับเวลาก่อน แล้วรันซ้ำใต้ tracemalloc เพื่อวัด peak (tracemalloc ทำให้ช้าลงหลายเท่า)"""
+    t0 = time.perf_counter(); res = fn(*args); dt = time.perf_counter() - t0
+    tracemalloc.start(); fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    return res, dt, peak / 2**20
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark legacy set-based vs hash-based row diff on a synthetic brand.")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--changed", type=float, default=0.01, help="สัดส่วนแถวที่ถูกแก้/เพิ่ม/ลบในไฟล์ใหม่")
+    args = ap.parse_args()
+
+    base = synth(args.rows)
+    k = max(1, int(args.rows * args.changed))
+    new = pd.concat([base.iloc[k:], synth(k, seed=1).assign(**{COLS[2]: lambda d: "99" + d[COLS[2]]})], ignore_index=True)
+    new.loc[new.index[:k], COLS[5]] = "ยกเลิก"
+    base, new = cb._clean_df(base), cb._clean_df(new)
+    print(f"baseline={len(base):,} แถว | incoming={len(new):,} แถว")
+
+    res = {}
+    for name, fn in (("legacy", legacy_diff), ("hash", cb.diff_rows)):
+        (added, removed, same), dt, mb = measure(fn, base, new)
+        res[name] = (dt, mb)
+        print(f"{name:6s} {dt:7.2f}s  peak={mb:8.1f}MB  added={len(added):,} removed={len(removed):,} unchanged={same:,}")
+    (t_old, m_old), (t_new, m_new) = res["legacy"], res["hash"]
+    print(f"เร็วขึ้น {t_old / t_new:.1f} เท่า | หน่วยความจำสูงสุดลดลง {100 * (1 - m_new / m_old):.0f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_waits.py – เทียบ latency ต่อการเปลี่ยนหน้า ระหว่าง wait แบบเดิม (sleep + polling) กับแบบ event (MutationObserver/endRequest)
+# -*- coding: utf-8 -*-
+# ใช้หน้า HTML จำลอง RadGrid ที่อัปเดตตารางแบบ async (หน่วงสุ่ม) จึงไม่ต้องต่อเว็บ อย.  ต้องมี Chrome ในเครื่อง
+#   python bench_waits.py --pages 40
+import time, argparse, statistics
+from urllib.parse import quote
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+import fda_engine as eng
+
+PAGE = """<!doctype html><html><body>
+<input class="rgCurrentPage" value="1">
+<table class="rgMasterTable"><tbody id="tb"></tbody></table>
+<input type="button" class="rgPageNext" value="Next" onclick="nextPage()">
+<script>
+var page = 1, busy = false, handlers = [];
+window.Sys = {WebForms: {PageRequestManager: {getInstance: function(){ return {
+  get_isInAsyncPostBack: function(){ return busy; },
+  add_endRequest: function(f){ handlers.push(f); },
+  remove_endRequest: function(f){ handlers = handlers.filter(function(g){ return g !== f; }); }
+}; }}}};
+function render(){
+  var html = '';
+  for (var i = 0; i < 10; i++) {
+    var n = (page - 1) * 10 + i + 1;
+    html += '<tr><td>10-1-67' + String(n).padStart(5, '0') + '</td><td>BRAND ' + n + '</td></tr>';
+  }
+  document.getElementById('tb').innerHTML = html;
+  document.querySelector('.rgCurrentPage').value = String(page);
+}
+function nextPage(){
+  busy = true;
+  setTimeout(function(){ page += 1; render(); busy = false; handlers.slice().forEach(function(f){ f(); }); }, DELAY());
+}
+function DELAY(){ return %(lo)d + Math.random() * %(spread)d; }
+render();
+</script></body></html>"""
+
+def legacy_first_row_key(drv) -> str:
+    rows = drv.find_elements(By.XPATH, "(//table[contains(@class,'rgMasterTable')]/tbody/tr[count(td)>=2])[1]")
+    return (rows[0].text or "").strip() if rows else ""
+
+def legacy_wait_for_rows(drv, timeout=120) -> int:
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        rows = drv.find_elements(By.XPATH, "//table[contains(@class,'rgMasterTable')]/tbody/tr[count(td)>=2]")
+        if rows: return len(rows)
+        drv.execute_script("window.scrollBy(0,200)"); time.sleep(0.25)
+    raise TimeoutError("ตารางยังไม่โหลด ภายในเวลาที่กำหนด")
+
+def legacy_go_next(drv) -> bool:
+    before_key, before_page = legacy_first_row_key(drv), eng.page_val(drv)
+    btn = drv.find_element(By.XPATH, "//input[contains(@class,'rgPageNext')]")
+    drv.execute_script("arguments[0].scrollIntoView({block:'center'});", btn); time.sleep(0.2)
+    drv.execute_script("arguments[0].click();", btn)
+    WebDriverWait(drv, 60).until(lambda d: legacy_first_row_key(d) != before_key or eng.page_val(d) != before_page)
+    legacy_wait_for_rows(drv)
+    return True
+
+def run(drv, url: str, step, pages: int) -> list:
+    drv.get(url); eng.wait_for_rows(drv)
+    lat = []
+    for _ in range(pages):
+        t0 = time.perf_counter(); step(drv); lat.append(time.perf_counter() - t0)
+    return lat
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark legacy vs event-driven grid waits on a simulated RadGrid page.")
+    ap.add_argument("--pages", type=int, default=30)
+    ap.add_argument("--delay-ms", type=int, default=80, help="หน่วงต่ำสุดของ async postback จำลอง")
+    ap.add_argument("--spread-ms", type=int, default=120, help="ช่วงสุ่มเพิ่มจาก delay-ms")
+    args = ap.parse_args()
+
+    url = "data:text/html;charset=utf-8," + quote(PAGE % {"lo": args.delay_ms, "spread": args.spread_ms})
+    drv = eng.setup(headless=True)
+    try:
+        res = {"legacy": run(drv, url, legacy_go_next, args.pages),
+               "event": run(drv, url, eng.go_next, args.pages)}
+    finally:
+        drv.quit()
+    for name, lat in res.items():
+        ms = sorted(x * 1000 for x in lat)
+        print(f"{name:7s} mean={statistics.mean(ms):7.1f}ms  p50={ms[len(ms)//2]:7.1f}ms  "
+              f"p95={ms[int(len(ms)*0.95) - 1]:7.1f}ms  total={sum(ms)/1000:6.2f}s  (10 แถว/หน้า -> {statistics.mean(ms)/10:5.1f}ms/แถว)")
+    old, new = statistics.mean(res["legacy"]), statistics.mean(res["event"])
+    print(f"ลดลง {100 * (1 - new / old):.0f}% ต่อหน้า")
+
+if __name__ == "__main__":
+    main()
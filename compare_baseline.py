@@ -1,40 +1,134 @@
 # compare & (optional) apply-to-baseline
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
 import argparse
+import importlib.util
+import time
+import multiprocessing as mp
 import pandas as pd
 
+import baseline_store
+
 ROOT = Path(__file__).resolve().parent
 BASELINE_DIR = ROOT / "baseline"
 INCOMING_DIR = ROOT / "incoming"
 OUT_DIR = ROOT / "out"
 DIFFS_DIR = OUT_DIR / "diffs"
 BACKUP_DIR = BASELINE_DIR / "_backups"  # เก็บแบ็กอัป baseline
+INCOMING_SUFFIXES = {".xlsx", ".xls", ".csv", ".parquet"}  # ชนิดไฟล์ใน ./incoming ที่อ่านได้ (ดูจากนามสกุล)
+KEY_COL = "เลขที่ใบรับจดแจ้ง"  # คีย์ของแถว: เลขเดิมแต่ค่าเปลี่ยน = modified (ไม่ใช่ removed + added)
 
 def _ts():
     return datetime.now().strftime("%Y-%m-%d_%H%M%S")
 
 def _clean_df(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    df = df.fillna("").astype(str)  # astype คืน frame ใหม่อยู่แล้ว ไม่ต้อง copy
     df.columns = [str(c).strip() for c in df.columns]
     for c in df.columns:
-        df[c] = df[c].astype(str).str.strip().replace({"nan": "", "None": ""})
+        df[c] = df[c].str.strip().replace({"nan": "", "None": ""})
     # เอาแถวซ้ำออก (ทั้งแถว)
     df = df.drop_duplicates()
     return df
 
+def _row_hashes(df: pd.DataFrame):
+    """hash 64 บิตต่อแถว (ตามค่าทุกคอลัมน์ เรียงตามลำดับคอลัมน์) – ใช้แทน set ของ tuple"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def diff_rows(base_df: pd.DataFrame, new_df: pd.DataFrame):
+    """anti-join ด้วย hash ของแถว -> (added, removed, unchanged_count) คงลำดับแถวเดิมของแต่ละไฟล์
+    (สองฝั่งผ่าน _clean_df แล้ว = ไม่มีแถวซ้ำ)"""
+    base_h, new_h = _row_hashes(base_df), _row_hashes(new_df)
+    in_base = pd.Index(base_h).isin(new_h)  # ใช้ hash table ของ pandas ไม่สร้าง tuple ต่อแถว
+    in_new = pd.Index(new_h).isin(base_h)
+    added = new_df[~in_new].reset_index(drop=True)
+    removed = base_df[~in_base].reset_index(drop=True)
+    return added, removed, int(in_new.sum())
+
+def diff_modified(base_df: pd.DataFrame, new_df: pd.DataFrame, added: pd.DataFrame, removed: pd.DataFrame):
+    """จับคู่ added/removed ที่ KEY_COL ตรงกัน -> (added, removed, modified แบบยาว: คีย์, column, before, after)
+    เฉพาะคีย์ที่ไม่ซ้ำทั้งสองไฟล์และคอลัมน์ตรงกัน – นอกนั้นคงเป็น added/removed ตามเดิม"""
+    modified = pd.DataFrame(columns=[KEY_COL, "column", "before", "after"])
+    if KEY_COL not in base_df.columns or list(base_df.columns) != list(new_df.columns):
+        return added, removed, modified
+    dup = set(base_df[KEY_COL][base_df[KEY_COL].duplicated()]) | set(new_df[KEY_COL][new_df[KEY_COL].duplicated()]) | {""}
+    keys = added[KEY_COL][added[KEY_COL].isin(removed[KEY_COL]) & ~added[KEY_COL].isin(dup)]  # ลำดับตามไฟล์ใหม่
+    if keys.empty:
+        return added, removed, modified
+    after = added.set_index(KEY_COL).loc[keys]
+    before = removed.set_index(KEY_COL).loc[keys]
+    changed = before.ne(after).stack()
+    changed = changed[changed]
+    modified = pd.DataFrame({
+        KEY_COL: changed.index.get_level_values(0),
+        "column": changed.index.get_level_values(1),
+        "before": before.stack()[changed.index].to_numpy(),
+        "after": after.stack()[changed.index].to_numpy(),
+    })
+    return (added[~added[KEY_COL].isin(keys)].reset_index(drop=True),
+            removed[~removed[KEY_COL].isin(keys)].reset_index(drop=True), modified)
+
+def _apply_modified(base_df: pd.DataFrame, new_df: pd.DataFrame, modified_df: pd.DataFrame) -> pd.DataFrame:
+    """แทนแถวใน baseline ที่ถูกแก้ ด้วยค่าจากไฟล์ใหม่ (ตำแหน่งแถวเดิม)"""
+    keys = modified_df[KEY_COL].unique()
+    if not len(keys):
+        return base_df
+    out = base_df.copy()
+    hit = out[KEY_COL].isin(keys)
+    latest = new_df[new_df[KEY_COL].isin(keys)].set_index(KEY_COL, drop=False)
+    out.loc[hit, :] = latest.loc[out.loc[hit, KEY_COL], out.columns].to_numpy()
+    return out
+
 def _read_baseline_csv(p: Path) -> pd.DataFrame:
     return pd.read_csv(p, dtype=str, keep_default_na=False, encoding="utf-8-sig")
 
+def _read_baseline(p: Path) -> pd.DataFrame:
+    """อ่านจาก baseline/_store (Parquet) ถ้ามีแบรนด์นี้ ไม่งั้นอ่าน CSV"""
+    if baseline_store.has_store(BASELINE_DIR):
+        df = baseline_store.read_source(BASELINE_DIR, p.stem)
+        if df is not None:
+            return df
+    return _read_baseline_csv(p)
+
+def _has_baseline(p: Path) -> bool:
+    return p.exists() or (baseline_store.has_store(BASELINE_DIR)
+                          and p.stem in baseline_store.load_manifest(baseline_store.store_dir(BASELINE_DIR)))
+
+def _write_baseline(df: pd.DataFrame, p: Path):
+    """เขียน CSV (ผลลัพธ์เดิม) + อัปเดต partition ใน store ให้ตรงกัน"""
+    _write_csv(df, p)
+    if baseline_store.has_store(BASELINE_DIR):
+        baseline_store.write_source(BASELINE_DIR, p.stem, df)
+
+def _read_incoming(p: Path, xlsx_engine: str = "openpyxl") -> pd.DataFrame:
+    """อ่านไฟล์ใหม่ตามนามสกุล – CSV จากสคริปต์ดึงข้อมูล (BRAND__*.csv) / Parquet ไม่ต้องผ่าน parser ของ xlsx"""
+    suffix = p.suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(p, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    if suffix == ".parquet":
+        return baseline_store.str_frame(pd.read_parquet(p))  # dtype จาก parquet (68 -> 68.0 ได้) -> str แบบ CSV
+    return pd.read_excel(p, sheet_name=0, dtype=str, engine=xlsx_engine if suffix == ".xlsx" else None)  # .xls: ให้ pandas เลือกเอง (openpyxl อ่านไม่ได้)
+
+def _xlsx_engine(name: str) -> str:
+    """calamine (python-calamine, pandas >= 2.2) อ่าน xlsx เร็วกว่า openpyxl มาก – ไม่มีติดตั้ง = ใช้ openpyxl"""
+    if name == "calamine":
+        if importlib.util.find_spec("python_calamine") is None:
+            print("[WARN] ไม่พบ python-calamine -> ใช้ openpyxl")
+            return "openpyxl"
+    return name
+
 def _write_csv(df: pd.DataFrame, p: Path):
     p.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(p, index=False, encoding="utf-8-sig")
 
-def _backup_baseline(brand_name: str, baseline_path: Path):
+def _backup_baseline(brand_name: str, baseline_path: Path, base_df: pd.DataFrame):
     BACKUP_DIR.mkdir(parents=True, exist_ok=True)
     stamp = _ts()
     dst = BACKUP_DIR / f"{brand_name}.{stamp}.csv"
-    baseline_path.replace(dst)
+    if baseline_path.exists():
+        baseline_path.replace(dst)
+    else:  # มีเฉพาะใน store
+        _write_csv(base_df, dst)
     print(f"[BACKUP] {baseline_path.name} -> {_rel(dst)}")
     return dst
 
@@ -44,34 +138,97 @@ def _rel(p: Path) -> str:
     except Exception:
         return p.as_posix()
 
-def compare_one(brand_base: Path, brand_new: Path):
-    base_df = _read_baseline_csv(brand_base)
+def compare_one(brand_base: Path, brand_new: Path, xlsx_engine: str = "openpyxl"):
+    t0 = time.perf_counter()
+    base_df = _read_baseline(brand_base)
     base_df = _clean_df(base_df)
+    t1 = time.perf_counter()
 
-    new_df = pd.read_excel(brand_new, sheet_name=0, dtype=str)
+    new_df = _read_incoming(brand_new, xlsx_engine)
     new_df = _clean_df(new_df)
+    read_s = {"read_baseline_s": round(t1 - t0, 3), "read_incoming_s": round(time.perf_counter() - t1, 3)}
 
     # จัดคอลัมน์ให้เทียบกันได้ (ถ้าเหมือนกันพอดีจะเรียงตาม baseline)
     if set(new_df.columns) == set(base_df.columns):
         new_df = new_df[base_df.columns]
 
-    base_rows = set(tuple(r) for r in base_df.to_numpy().tolist())
-    new_rows  = set(tuple(r) for r in new_df.to_numpy().tolist())
+    added_df, removed_df, unchanged_count = diff_rows(base_df, new_df)
+    added_df, removed_df, modified_df = diff_modified(base_df, new_df, added_df, removed_df)
+    return base_df, new_df, added_df, removed_df, modified_df, unchanged_count, read_s
+
+def compare_brand(task):
+    """งานต่อแบรนด์ (รันใน worker ได้): อ่าน + diff + เตรียม baseline ใหม่ -> ผลที่ writer ต้องใช้
+    ไม่เขียนอะไรลงดิสก์ – แบ็กอัป/เขียน baseline/store ทำที่ process หลัก (apply_brand) ที่เดียว"""
+    x, apply, xlsx_engine = task
+    brand_name = x.stem
+    baseline_path = BASELINE_DIR / f"{brand_name}.csv"
+    base_df, new_df, added_df, removed_df, modified_df, unchanged_count, read_s = compare_one(baseline_path, x, xlsx_engine)
+    modified_count = modified_df[KEY_COL].nunique()
 
-    added = new_rows - base_rows
-    removed = base_rows - new_rows
-    unchanged = new_rows & base_rows
+    # ---- APPLY (เตรียม baseline ใหม่) ----
+    applied, apply_df = None, None
+    if apply == "replace":
+        # baseline ใหม่เป็น new_df (ใช้คอลัมน์ตาม new_df)
+        apply_df = new_df
+        applied = f"replace -> {baseline_path.name} (from {_rel(x)})"
+    elif apply == "append":
+        # เพิ่มเฉพาะ added_df ต่อท้าย baseline เดิม (แถวที่ถูกแก้ = อัปเดตค่าในแถวเดิม)
+        combined = pd.concat([_apply_modified(base_df, new_df, modified_df), added_df], ignore_index=True)
+        apply_df = _clean_df(combined).drop_duplicates()
+        applied = f"append {len(added_df)} row(s), update {modified_count} row(s) -> {baseline_path.name}"
 
-    added_df = pd.DataFrame(list(added), columns=base_df.columns)
-    removed_df = pd.DataFrame(list(removed), columns=base_df.columns)
+    return {
+        "brand": brand_name, "added": added_df, "removed": removed_df, "modified": modified_df,
+        "apply_df": apply_df, "base_df": base_df if apply_df is not None else None,
+        "summary": {
+            "brand": brand_name,
+            "added_rows": len(added_df),
+            "removed_rows": len(removed_df),
+            "modified_rows": modified_count,
+            "unchanged_rows": unchanged_count,
+            "incoming_rows": len(new_df),
+            "baseline_rows": len(base_df),
+            "incoming_file": x.name,
+            **read_s,
+            "applied": applied or "-"
+        },
+    }
 
-    return base_df, new_df, added_df, removed_df, len(unchanged)
+def apply_brand(res: dict):
+    """แบ็กอัปแล้วเขียน baseline ใหม่ (CSV + store) – เรียกที่ process หลักเท่านั้น (manifest ของ store ไม่รองรับหลาย writer)"""
+    if res["apply_df"] is None: return
+    brand_name = res["brand"]
+    baseline_path = BASELINE_DIR / f"{brand_name}.csv"
+    _backup_baseline(brand_name, baseline_path, res["base_df"])  # ทำแบ็กอัปก่อนเสมอ
+    _write_baseline(res["apply_df"], baseline_path)
+    print(f"[APPLY] {brand_name}: {res['summary']['applied']}", flush=True)
+
+def write_brand(writer, res: dict):
+    """ส่วนที่ต้องทำทีละแบรนด์ใน process เดียว: ชีตใน workbook + CSV diff"""
+    brand_name, summ = res["brand"], res["summary"]
+    # ---- เขียนรายงานต่อชีต ----
+    res["added"].to_excel(writer, sheet_name=f"{brand_name}__added", index=False)
+    res["removed"].to_excel(writer, sheet_name=f"{brand_name}__removed", index=False)
+    res["modified"].to_excel(writer, sheet_name=f"{brand_name}__modified", index=False)
+    pd.DataFrame([{k: summ[k] for k in ("brand", "unchanged_rows", "added_rows", "removed_rows",
+                                        "modified_rows", "incoming_rows", "baseline_rows")}]
+                 ).to_excel(writer, sheet_name=f"{brand_name}__unchanged_count", index=False)
+
+    # ---- เขียน CSV diff ต่อแบรนด์ ----
+    brand_dir = DIFFS_DIR / brand_name
+    brand_dir.mkdir(parents=True, exist_ok=True)
+    _write_csv(res["added"], brand_dir / "added.csv")
+    _write_csv(res["removed"], brand_dir / "removed.csv")
+    _write_csv(res["modified"], brand_dir / "modified.csv")
 
 def main():
-    parser = argparse.ArgumentParser(description="Compare incoming xlsx vs baseline csv per brand (+ optional apply).")
+    parser = argparse.ArgumentParser(description="Compare incoming xlsx/csv/parquet vs baseline csv per brand (+ optional apply).")
     parser.add_argument("--apply", choices=["none", "replace", "append"], default="none",
                         help="none=ไม่อัปเดต baseline | replace=เขียนทับ baseline ด้วยไฟล์ใหม่ | append=เพิ่มเฉพาะแถวใหม่")
-    parser.add_argument("--incoming-glob", default="*.xlsx", help="แพทเทิร์นไฟล์ใน ./incoming (เช่น *.xlsx)")
+    parser.add_argument("--incoming-glob", default="*.xlsx", help="แพทเทิร์นไฟล์ใน ./incoming (เช่น *.xlsx, BRAND__*.csv, *.parquet)")
+    parser.add_argument("--xlsx-engine", choices=["openpyxl", "calamine"], default="openpyxl",
+                        help="ตัวอ่าน xlsx: calamine เร็วกว่า (ต้องมี python-calamine)")
+    parser.add_argument("--jobs", type=int, default=1, help="จำนวน process ที่อ่าน/diff แบรนด์พร้อมกัน (workbook เขียนที่ process หลักที่เดียว)")
     args = parser.parse_args()
 
     OUT_DIR.mkdir(exist_ok=True)
@@ -80,78 +237,50 @@ def main():
     timestamp = datetime.now().strftime("%Y-%m-%d")
     out_xlsx = OUT_DIR / f"new_changes_{timestamp}.xlsx"
 
+    xlsx_files = sorted(p for p in INCOMING_DIR.glob(args.incoming_glob) if p.suffix.lower() in INCOMING_SUFFIXES)
+    # ชีต/โฟลเดอร์ diff/baseline ผูกกับชื่อแบรนด์ (stem) – BRAND__AR.csv กับ BRAND__AR.xlsx จะเขียนทับกันเงียบ ๆ
+    dup = sorted(stem for stem, n in Counter(p.stem for p in xlsx_files).items() if n > 1)
+    if dup:
+        parser.error("ไฟล์ใน ./incoming ชื่อแบรนด์ซ้ำกัน (ต่างกันแค่นามสกุล) – เหลือไว้ไฟล์เดียว: "
+                     + ", ".join(p.name for p in xlsx_files if p.stem in dup))
+
     writer = pd.ExcelWriter(out_xlsx, engine="xlsxwriter")
     summary_rows = []
 
-    xlsx_files = sorted(INCOMING_DIR.glob(args.incoming_glob))
     if not xlsx_files:
         print("No files matched in ./incoming. Nothing to do.")
         writer.close()
         return
 
-    print(f"[START] apply={args.apply}")
+    print(f"[START] apply={args.apply} jobs={args.jobs}")
+    xlsx_engine = _xlsx_engine(args.xlsx_engine)
+    tasks = []
     for x in xlsx_files:
-        brand_name = x.stem
-        baseline_path = BASELINE_DIR / f"{brand_name}.csv"
-        if not baseline_path.exists():
-            print(f"[SKIP] No baseline CSV for {brand_name}: {baseline_path.name}")
+        baseline_path = BASELINE_DIR / f"{x.stem}.csv"
+        if not _has_baseline(baseline_path):
+            print(f"[SKIP] No baseline CSV for {x.stem}: {baseline_path.name}")
             continue
+        tasks.append((x, args.apply, xlsx_engine))
 
-        print(f"[COMPARE] {brand_name}")
-        base_df, new_df, added_df, removed_df, unchanged_count = compare_one(baseline_path, x)
-
-        # ---- เขียนรายงานต่อชีต ----
-        added_df.to_excel(writer, sheet_name=f"{brand_name}__added", index=False)
-        removed_df.to_excel(writer, sheet_name=f"{brand_name}__removed", index=False)
-        pd.DataFrame([{
-            "brand": brand_name,
-            "unchanged_rows": unchanged_count,
-            "added_rows": len(added_df),
-            "removed_rows": len(removed_df),
-            "incoming_rows": len(new_df),
-            "baseline_rows": len(base_df)
-        }]).to_excel(writer, sheet_name=f"{brand_name}__unchanged_count", index=False)
-
-        # ---- เขียน CSV diff ต่อแบรนด์ ----
-        brand_dir = DIFFS_DIR / brand_name
-        brand_dir.mkdir(parents=True, exist_ok=True)
-        _write_csv(added_df, brand_dir / "added.csv")
-        _write_csv(removed_df, brand_dir / "removed.csv")
-
-        # ---- APPLY (อัปเดต baseline) ----
-        applied = None
-        if args.apply != "none":
-            # ทำแบ็กอัปก่อนเสมอ
-            backup_path = _backup_baseline(brand_name, baseline_path)
-            if args.apply == "replace":
-                # เขียน baseline ใหม่เป็น new_df (ใช้คอลัมน์ตาม new_df)
-                _write_csv(new_df, baseline_path)
-                applied = f"replace -> {baseline_path.name} (from {_rel(x)})"
-            elif args.apply == "append":
-                # เพิ่มเฉพาะ added_df ต่อท้าย baseline เดิม
-                combined = pd.concat([base_df, added_df], ignore_index=True)
-                combined = _clean_df(combined).drop_duplicates()
-                _write_csv(combined, baseline_path)
-                applied = f"append {len(added_df)} row(s) -> {baseline_path.name}"
-            print(f"[APPLY] {brand_name}: {applied}")
-
-        # ---- สรุป ----
-        summary_rows.append({
-            "brand": brand_name,
-            "added_rows": len(added_df),
-            "removed_rows": len(removed_df),
-            "unchanged_rows": unchanged_count,
-            "incoming_rows": len(new_df),
-            "baseline_rows": len(base_df),
-            "applied": applied or "-"
-        })
+    # imap (คงลำดับ) = ชีตเรียงตามชื่อไฟล์เสมอ ไม่ว่า worker ไหนเสร็จก่อน; ผลแต่ละแบรนด์เขียนทันทีที่ถึงคิว
+    pool = mp.Pool(processes=min(args.jobs, len(tasks))) if args.jobs > 1 and len(tasks) > 1 else None
+    try:
+        for res in (pool.imap(compare_brand, tasks) if pool else map(compare_brand, tasks)):
+            summ = res["summary"]
+            print(f"[COMPARE] {res['brand']} (อ่าน {summ['incoming_file']} {summ['read_incoming_s']:.2f}s, baseline {summ['read_baseline_s']:.2f}s)")
+            apply_brand(res)
+            write_brand(writer, res)
+            summary_rows.append(res["summary"])
+    finally:
+        if pool:
+            pool.close(); pool.join()
 
     if summary_rows:
         pd.DataFrame(summary_rows).sort_values("brand").to_excel(writer, sheet_name="__SUMMARY__", index=False)
 
     writer.close()
     print(f"Done. Wrote report: {_rel(out_xlsx)}")
-    print(f"Diff CSVs: {_rel(DIFFS_DIR)}/<BRAND>/added.csv, removed.csv")
+    print(f"Diff CSVs: {_rel(DIFFS_DIR)}/<BRAND>/added.csv, removed.csv, modified.csv")
     if args.apply != "none":
         print(f"Backups saved in: {_rel(BACKUP_DIR)}")
 
@@ -0,0 +1,149 @@
+# fda_cache.py – cache รายละเอียด (ContentPlaceHolder1_lb_*) ต่อเลขจดแจ้ง ข้ามรอบรัน (SQLite)
+# -*- coding: utf-8 -*-
+# record ที่ยังไม่หมด TTL ไม่ต้องยิง postback ใหม่; ใกล้วันหมดอายุใบรับจดแจ้ง = ตรวจซ้ำถี่ขึ้น
+import os, re, json, time, sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fda_http import log
+
+# ===== คอนฟิก =====
+CACHE_TTL_DAYS = float(os.environ.get("FDA_CACHE_TTL_DAYS", "30"))  # อายุ cache ปกติ
+NEAR_EXPIRY_DAYS = 60      # expire_date อยู่ในช่วง N วันนี้ (ก่อน/หลัง) -> สถานะมักเปลี่ยน
+NEAR_EXPIRY_TTL_DAYS = 1   # ... จึงตรวจซ้ำทุกวัน
+FINAL_TTL_FACTOR = 4       # สถานะสิ้นสุดแล้ว (ยกเลิก/สิ้นอายุ) เปลี่ยนยาก -> TTL ยาวขึ้น N เท่า
+FINAL_STATUS = ("ยกเลิก", "สิ้นอายุ", "เพิกถอน")
+FP_MAX_AGE_DAYS = float(os.environ.get("FDA_FP_MAX_AGE_DAYS", "7"))  # fingerprint เก่ากว่านี้ = ดึงเต็มอีกรอบ (สถานะ/วันที่ในรายละเอียดเปลี่ยนได้โดยผลค้นหาเท่าเดิม)
+DAY = 86400.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS details (
+    notification_no TEXT PRIMARY KEY,
+    record      TEXT NOT NULL,  -- JSON ตาม COLS
+    field_since TEXT NOT NULL,  -- JSON {คอลัมน์: เวลาที่ดึงได้ค่านี้ครั้งแรก} (ค่าไม่เปลี่ยน = เวลาเดิม)
+    fetched_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL
+)
+"""
+
+TH_MONTHS = {"ม.ค.": 1, "ก.พ.": 2, "มี.ค.": 3, "เม.ย.": 4, "พ.ค.": 5, "มิ.ย.": 6,
+             "ก.ค.": 7, "ส.ค.": 8, "ก.ย.": 9, "ต.ค.": 10, "พ.ย.": 11, "ธ.ค.": 12}
+
+def parse_th_date(s: str) -> Optional[datetime]:
+    """'20/3/2571' หรือ '20 มี.ค. 2571' (พ.ศ. หรือ ค.ศ.) -> datetime; อ่านไม่ได้ = None"""
+    s = (s or "").strip()
+    m = re.match(r"(\d{1,2})\s*/\s*(\d{1,2})\s*/\s*(\d{4})", s)
+    if m: d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    else:
+        m = re.match(r"(\d{1,2})\s*(\S+)\s*(\d{4})", s)
+        if not m or m.group(2) not in TH_MONTHS: return None
+        d, mo, y = int(m.group(1)), TH_MONTHS[m.group(2)], int(m.group(3))
+    if y > 2400: y -= 543
+    try: return datetime(y, mo, d)
+    except ValueError: return None
+
+def ttl_seconds(rec: Dict, now: float) -> float:
+    """TTL ตามสถานะ: ใกล้/เพิ่งเลย expire_date = 1 วัน, สถานะสิ้นสุดแล้ว = ยาวขึ้น, ปกติ = CACHE_TTL_DAYS
+    และไม่ให้ cache อยู่เลยวันหมดอายุ (ต้องเห็นสถานะหลังหมดอายุ)"""
+    ttl = CACHE_TTL_DAYS * DAY
+    if any(s in (rec.get("notification_status") or "") for s in FINAL_STATUS):
+        return ttl * FINAL_TTL_FACTOR
+    exp = parse_th_date(rec.get("expire_date", ""))
+    if exp is None: return ttl
+    left = exp.timestamp() - now
+    if abs(left) <= NEAR_EXPIRY_DAYS * DAY: return NEAR_EXPIRY_TTL_DAYS * DAY
+    return min(ttl, left) if left > 0 else ttl
+
+def open_cache(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")  # หลาย worker อ่าน/เขียนพร้อมกันได้
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(SCHEMA)
+    return conn
+
+def cache_get(conn: sqlite3.Connection, no: str, now: Optional[float] = None) -> Optional[Tuple[Dict, float]]:
+    """(record, เวลาที่ดึง) ที่ยังไม่หมดอายุ cache – หมดอายุ/ไม่มี = None (ต้อง revalidate ด้วย postback)"""
+    row = conn.execute("SELECT record, fetched_at FROM details WHERE notification_no = ? AND expires_at > ?",
+                       (no, time.time() if now is None else now)).fetchone()
+    return (json.loads(row[0]), row[1]) if row else None
+
+def cache_put(conn: sqlite3.Connection, rec: Dict, now: Optional[float] = None):
+    no = rec.get("notification_no", "")
+    if not no: return
+    now = time.time() if now is None else now
+    old = conn.execute("SELECT record, field_since FROM details WHERE notification_no = ?", (no,)).fetchone()
+    old_rec, old_since = (json.loads(old[0]), json.loads(old[1])) if old else ({}, {})
+    since = {k: old_since.get(k, now) if k in old_rec and old_rec[k] == v else now for k, v in rec.items()}
+    conn.execute("INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)",
+                 (no, json.dumps(rec, ensure_ascii=False), json.dumps(since), now, now + ttl_seconds(rec, now)))
+    conn.commit()
+
+class DetailStore:
+    """mapping เลขจดแจ้ง -> record ที่ engine ใช้ตัดสินว่าต้องเปิดหน้ารายละเอียดหรือไม่
+    mem = record ในรอบนี้ (dict หรือ Manager dict ที่แชร์ข้าม worker); path = ไฟล์ SQLite ('' = ไม่ใช้ cache)
+    `no in store` -> มีในรอบนี้ หรือมีใน cache ที่ยังไม่หมด TTL (ดึงขึ้นมาเก็บใน mem ให้)"""
+    def __init__(self, mem=None, path: str = ""):
+        self.mem = {} if mem is None else mem
+        self.path, self.hits = path, 0
+        self._conn, self._pid = None, None
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path: return None
+        if self._conn is None or self._pid != os.getpid():  # connection ใช้ข้าม fork ไม่ได้
+            self._conn, self._pid = open_cache(self.path), os.getpid()
+        return self._conn
+
+    def __contains__(self, no) -> bool:
+        if no in self.mem: return True
+        db = self._db()
+        got = cache_get(db, no) if db is not None else None
+        if got is None: return False
+        self.mem[no] = got[0]; self.hits += 1
+        log(f"     ↺ {no}: ใช้รายละเอียดจาก cache (ดึงเมื่อ {datetime.fromtimestamp(got[1]):%Y-%m-%d}, สถานะ '{got[0].get('notification_status', '')}')")
+        return True
+
+    def __getitem__(self, no) -> Dict:
+        if no in self: return self.mem[no]
+        raise KeyError(no)
+
+    def __setitem__(self, no, rec: Dict):
+        self.mem[no] = rec
+        db = self._db()
+        if db is not None: cache_put(db, rec)
+
+    def __len__(self) -> int:
+        return len(self.mem)
+
+# ===== Fingerprint ของผลค้นหา (ข้ามการไล่หน้า/เปิดรายละเอียดเมื่อผลไม่เปลี่ยน) =====
+GRID_SCHEMA = """
+CREATE TABLE IF NOT EXISTS grids (
+    grid_key   TEXT PRIMARY KEY,  -- ชนิด|ชื่อ|ปี
+    total      INTEGER NOT NULL,  -- จำนวนผลจาก pager ('N items')
+    records    TEXT NOT NULL,     -- JSON record ทุกแถวของการค้นหานี้ (ใช้แทนเมื่อข้าม)
+    checked_at REAL NOT NULL
+)
+"""
+
+def open_fingerprints(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(GRID_SCHEMA)
+    return conn
+
+def fp_get(conn: sqlite3.Connection, key: str, now: Optional[float] = None) -> Optional[Tuple[int, List[Dict]]]:
+    """(จำนวนผล, records) ของรอบก่อน – ไม่มี/เก่ากว่า FP_MAX_AGE_DAYS = None"""
+    now = time.time() if now is None else now
+    row = conn.execute("SELECT total, records FROM grids WHERE grid_key = ? AND checked_at > ?",
+                       (key, now - FP_MAX_AGE_DAYS * DAY)).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+def fp_put(conn: sqlite3.Connection, key: str, total: int, records: List[Dict]):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO grids VALUES (?, ?, ?, ?)",
+                     (key, total, json.dumps(records, ensure_ascii=False), time.time()))
+
+def fp_unchanged(fp: Optional[Tuple[int, List[Dict]]], total: int, first_nos: List[str]) -> bool:
+    """จำนวนผลเท่าเดิม และเลขจดแจ้งทุกตัวในหน้าแรกเคยอยู่ในผลรอบก่อน = ถือว่าไม่เปลี่ยน"""
+    if not fp or total <= 0 or fp[0] != total: return False
+    known = {r.get("notification_no", "") for r in fp[1]}
+    return all(no in known for no in first_nos)
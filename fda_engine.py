@@ -0,0 +1,1315 @@
+# fda_engine.py – เครื่องมือดึงข้อมูลกลางของ FDABrands.py / FDAOPERATORS.py (ค้นยี่ห้อหรือผู้ประกอบการ + รายงาน diff)
+# -*- coding: utf-8 -*-
+import os, re, time, json, ssl, signal, smtplib, unicodedata
+from typing import List, Dict, Tuple, Optional
+from collections import Counter, defaultdict
+from datetime import datetime
+import pandas as pd
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from webdriver_manager.chrome import ChromeDriverManager
+import multiprocessing as mp
+from email.message import EmailMessage
+from selenium.common.exceptions import TimeoutException, WebDriverException
+import fda_http
+from fda_http import log, year_from_no, notif_from_row_text, DetailOpenError
+import baseline_store
+from fda_cache import DetailStore, CACHE_TTL_DAYS, FP_MAX_AGE_DAYS, open_fingerprints, fp_get, fp_put, fp_unchanged
+from fda_seen import open_seen
+
+# ===== URL =====
+URL = "https://pertento.fda.moph.go.th/FDA_SEARCH_CENTER/PRODUCT/FRM_SEARCH_CMT.aspx"
+
+# ===== คอนฟิก =====
+FAST_MODE = True
+ENGINE    = os.environ.get("FDA_ENGINE", "selenium")  # "selenium" | "http" (ยิง postback ตรง ไม่เปิด Chrome)
+DETAIL_CONCURRENCY = int(os.environ.get("FDA_DETAIL_CONCURRENCY", "4"))  # >1 = ดึงหน้ารายละเอียดพร้อมกันผ่าน HTTP (asyncio)
+DETAIL_MODE = os.environ.get("FDA_DETAIL_MODE", "navigate")  # navigate = คลิกทีละแถวแล้ว back | http = requests ขนานด้วย state ของ Chrome | iframe = postback ลง iframe ซ่อน ไม่ออกจาก grid
+INCREMENTAL = os.environ.get("FDA_INCREMENTAL", "0") == "1"  # เลขจดแจ้งที่เคยเห็นแล้ว ใช้ record ในเครื่อง ไม่เปิดหน้ารายละเอียด
+DETAIL_CACHE = os.environ.get("FDA_DETAIL_CACHE", "0") == "1"  # (ปิดไว้ก่อน) cache รายละเอียดข้ามรอบใน <outdir>/_detail_cache.sqlite (TTL: FDA_CACHE_TTL_DAYS) – สถานะที่เปลี่ยนภายใน TTL จะไม่เห็น
+COLLAPSE_BRANDS = os.environ.get("FDA_COLLAPSE_BRANDS", "0") == "1"  # (ปิดไว้ก่อน) ยี่ห้อที่มีชื่อยี่ห้ออื่นอยู่ข้างใน (BK ACNE ⊃ BK) ไม่ค้นเอง กรองจากผลของชื่อกว้างสุด
+FINGERPRINT = os.environ.get("FDA_FINGERPRINT", "0") == "1"  # (ปิดไว้ก่อน) จำนวนผล + เลขจดแจ้งหน้าแรกเท่ารอบก่อน = ข้ามการไล่หน้า/รายละเอียด (<outdir>/_grid_fp.sqlite) – หน้าถัดไปที่เปลี่ยนภายใน FDA_FP_MAX_AGE_DAYS จะไม่เห็น
+DRIVER_RECYCLE_EVERY = 25  # WORKERS > 1: ใช้ Chrome ตัวเดิมต่อ process แล้วเปิดใหม่ทุก N งาน (หรือเมื่อ crash)
+SHARD_PAGES = 20     # WORKERS > 1: งานที่คาดว่ายาวเกิน N หน้า แบ่งเป็นช่วงละ N หน้าให้หลาย worker
+PAGE_SIZE = fda_http.PAGE_SIZE  # FDA_PAGE_SIZE: แถวต่อหน้าที่ตั้งให้ RadGrid หลังค้นหา ก่อนไล่หน้า (0 = ค่าเดิมของเว็บ)
+WARM_FORM = fda_http.WARM_FORM  # FDA_WARM_FORM: ค้นหาถัดไปใช้ฟอร์มบนหน้าเดิม (ล้างค่าแล้วกรอกใหม่) ไม่ drv.get(URL) ทุกครั้ง
+GRID_PAGE_SIZE = PAGE_SIZE or 10  # แถวต่อหน้าของ RadGrid (ใช้แปลงจำนวนแถวรอบก่อนเป็นจำนวนหน้า / เลขหน้าใน journal)
+NEWEST_FIRST = fda_http.NEWEST_FIRST  # FDA_NEWEST_FIRST: เรียงใหม่สุดก่อน + หยุดไล่หน้าเมื่อทั้งหน้าอยู่ใน _items_seen แล้ว (CSV ต่อ query = เฉพาะหัวรายการ)
+GRID_ORDER = "desc" if NEWEST_FIRST else ""  # ลำดับของ grid ที่บันทึกใน journal (เลขหน้าใช้ได้เฉพาะลำดับเดียวกัน)
+ALLOW_YY  = {"68"}  # ปีพ.ศ. 25 68 (สองหลักท้าย)
+RESULT_CAP = int(os.environ.get("FDA_RESULT_CAP", "0"))  # เพดานจำนวนผลต่อการค้นหาของเว็บ (0 = ไม่มี) – ค้นรวมหลายปีแล้วชน = แยกค้นทีละปี
+ALL_YY = ""  # yy2 ของการค้นรวมทุกปีใน ALLOW_YY (เว้นช่องปีว่าง แล้วกรองปีจากเลขจดแจ้งเอง)
+
+COLS = [
+    "trade_name","cosmetic_name","notification_no","notification_year_be_last2",
+    "notification_type","notification_status","approve_date","expire_date",
+    "operator_name","foreign_mfr","contract_manufacturer","reference_for","skus",
+]
+TH_HEADERS = {
+    "trade_name":"ชื่อการค้า","cosmetic_name":"ชื่อเครื่องสำอาง","notification_no":"เลขที่ใบรับจดแจ้ง",
+    "notification_year_be_last2":"ปีที่จดแจ้ง","notification_type":"ประเภทการจดแจ้ง",
+    "notification_status":"สถานะใบรับจดแจ้ง","approve_date":"วันที่อนุญาต","expire_date":"วันที่หมดอายุ",
+    "operator_name":"ชื่อผู้ประกอบการ","foreign_mfr":"ชื่อและที่อยู่ผู้ผลิตต่างประเทศ",
+    "contract_manufacturer":"ชื่อผู้ว่าจ้างผลิต","reference_for":"เลขอ้างอิงสำหรับ","skus":"SKUs",
+}
+BASE_HEADERS = [TH_HEADERS[c] for c in COLS if c in TH_HEADERS]
+
+# ชนิดของ query: คอลัมน์ที่ติดกับ record, ชื่อไฟล์ CSV ต่อ query และคำที่ใช้ใน log
+QUERY_KINDS = {
+    "brand":    {"col": "brand_query",         "csv": lambda q: f"BRAND__{safe_name(q)}.csv", "label": "ยี่ห้อ"},
+    "operator": {"col": "operator_name_query", "csv": lambda q: f"{safe_name(q)}.csv",        "label": "ผู้ประกอบการ"},
+}
+
+_DETAIL_SESS = None  # requests.Session ที่ยืม cookie จาก Chrome (โหมด DETAIL_CONCURRENCY > 1)
+RECORD_STORE: Dict[str, Dict] = {}  # notification_no -> record (เดิมจากโหมด INCREMENTAL + cache ที่ยังไม่หมด TTL + ที่ดึงแล้วในรอบนี้)
+PAGE_HOPS: Counter = Counter()  # (ชนิด, ชื่อ) -> จำนวนหน้า grid ที่ดึงจริงในรอบนี้ (ไว้ดูผลของ PAGE_SIZE ใน log)
+FP_SKIPS: Counter = Counter()  # (ชนิด, ชื่อ) -> จำนวนการค้นหาที่ข้ามเพราะ fingerprint ไม่เปลี่ยน
+FP_PATH = ""  # <outdir>/_grid_fp.sqlite (ตั้งใน crawl; "" = ไม่ใช้ fingerprint)
+_FP = {"conn": None, "pid": None}
+SEEN_PATH = ""  # <outdir>/_items_seen.json (ตั้งใน crawl เมื่อ NEWEST_FIRST)
+_SEEN = {"idx": None, "pid": None}
+JOURNAL_PATH = ""  # <outdir>/_journal.jsonl (ตั้งใน crawl)
+JOURNAL: Dict = {"done": set(), "pages": {}}  # สถานะจาก journal เดิม (โหมด --resume)
+
+# ---------- WebDriver ----------
+def setup(headless=True, driver_path=None):
+    opt = Options()
+    if headless: opt.add_argument("--headless=new")
+    opt.add_argument("--window-size=1400,900")
+    opt.add_argument("--disable-gpu"); opt.add_argument("--use-gl=swiftshader")
+    opt.add_argument("--disable-gpu-compositing"); opt.add_argument("--no-sandbox")
+    opt.add_argument("--disable-extensions"); opt.add_argument("--disable-dev-shm-usage")
+    opt.add_argument("--disable-background-networking"); opt.add_argument("--disable-background-timer-throttling")
+    opt.add_argument("--disable-renderer-backgrounding")
+    opt.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints,PaintHolding")
+    opt.add_argument("--blink-settings=imagesEnabled=false")
+    opt.add_argument("--lang=th-TH"); opt.add_argument("--remote-allow-origins=*")
+    opt.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36")
+    opt.add_experimental_option("excludeSwitches", ["enable-automation","enable-logging"])
+    opt.add_experimental_option("useAutomationExtension", False)
+    opt.page_load_strategy = "eager"
+    opt.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    drv = webdriver.Chrome(service=Service(driver_path or ChromeDriverManager().install()), options=opt)
+    drv.set_page_load_timeout(120)
+    drv.set_script_timeout(300)  # เพดานของ execute_async_script (wait_event คุมเวลาเองใน JS)
+    try:
+        drv.execute_cdp_cmd("Network.enable", {})
+        drv.execute_cdp_cmd("Network.setBlockedURLs", {"urls": ["*.png","*.jpg","*.jpeg","*.gif","*.webp","*.svg","*.woff","*.woff2","*.ttf","*.otf"]})
+        drv.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+            "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+        })
+    except Exception:
+        pass
+    return drv
+
+def open_client(headless=True, driver_path=None):
+    return fda_http.new_session() if ENGINE == "http" else setup(headless=headless, driver_path=driver_path)
+
+def close_client(client):
+    if ENGINE == "http": client.close()
+    else: client.quit()
+
+# ---------- Event-driven waits (MutationObserver + PageRequestManager.endRequest) ----------
+_H_JS = r"""
+var h = {
+  x: function(xp){ return document.evaluate(xp, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue; },
+  rows: function(){
+    var r = document.evaluate("//table[contains(@class,'rgMasterTable')]/tbody/tr[count(td)>=2]", document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var a = []; for (var i = 0; i < r.snapshotLength; i++) a.push(r.snapshotItem(i)); return a;
+  },
+  noRecords: function(){ return !!h.x("//td[contains(.,'No records to display')]"); },
+  pageVal: function(){ var e = h.x("//input[contains(@class,'rgCurrentPage')]"); return e ? (e.value || '').trim() : ''; },
+  firstRowKey: function(){
+    var r = h.rows()[0]; if (!r) return '';
+    var t = r.innerText || '', m = t.match(/\b(\d{1,2})\D+(\d{1,2})\D+(\d{2,})\b/);
+    return m ? m[1] + '-' + m[2] + '-' + m[3] : t.trim();
+  },
+  idle: function(){
+    try {
+      if (window.Telerik && Telerik.Web && Telerik.Web.UI && Telerik.Web.UI.RadAjaxManager) {
+        var m = Telerik.Web.UI.RadAjaxManager.getCurrent();
+        if (m && typeof m.get_isRequesting === 'function') return !m.get_isRequesting();
+      }
+      if (window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager) {
+        var pr = Sys.WebForms.PageRequestManager.getInstance();
+        if (pr) return !pr.get_isInAsyncPostBack();
+      }
+    } catch(e) {}
+    return document.readyState === 'complete';
+  }
+};
+"""
+_WAIT_JS = _H_JS + r"""
+var cond = new Function('h', 'args', 'return (' + arguments[0] + ');'), args = arguments[1], ms = arguments[2];
+var done = arguments[arguments.length - 1], finished = false, obs = null, prm = null, timer = null;
+var onEnd = function(){ setTimeout(check, 0); };  // ตัวเดียวกับที่ add_endRequest ไว้ ไม่งั้นถอด handler ไม่ออก
+function finish(v){
+  if (finished) return; finished = true;
+  if (obs) obs.disconnect(); if (prm) { try { prm.remove_endRequest(onEnd); } catch(e) {} }
+  clearTimeout(timer); document.removeEventListener('readystatechange', check); done(v);
+}
+function check(){ try { if (cond(h, args)) finish(true); } catch(e) {} }
+check(); if (finished) return;
+obs = new MutationObserver(check);
+obs.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+try { prm = Sys.WebForms.PageRequestManager.getInstance(); prm.add_endRequest(onEnd); } catch(e) { prm = null; }
+document.addEventListener('readystatechange', check);
+timer = setTimeout(function(){ finish(false); }, ms);
+"""
+
+def wait_event(drv, cond_js: str, timeout=60, *args) -> bool:
+    """รอจนนิพจน์ JS cond_js (ใช้ h.* และ args[i] ได้) เป็นจริง – เช็กทุกครั้งที่ DOM เปลี่ยน/async postback จบ ไม่มี sleep
+    ถ้าหน้าถูกโหลดใหม่ระหว่างรอ (form.submit / back) สคริปต์จะหลุด -> รอต่อบนเอกสารใหม่จนครบเวลา"""
+    deadline = time.time() + timeout
+    while True:
+        left = deadline - time.time()
+        if left <= 0: return False
+        try:
+            return bool(drv.execute_async_script(_WAIT_JS, cond_js, list(args), int(left * 1000)))
+        except TimeoutException:
+            return False
+        except WebDriverException:
+            continue
+
+def grid_key(drv) -> Tuple[str, str]:
+    """(เลขจดแจ้งแถวแรก, หน้าปัจจุบัน) คำนวณด้วย JS ชุดเดียวกับ wait_event"""
+    k, p = drv.execute_script(_H_JS + "return [h.firstRowKey(), h.pageVal()];")
+    return k, p
+
+GRID_ROWS_JS = _H_JS + r"""
+return h.rows().map(function(r, i){
+  var a = Array.prototype.filter.call(r.querySelectorAll("a[href*='__doPostBack']"),
+                                      function(x){ return (x.textContent || '').indexOf('ดูข้อมูล') >= 0; })[0];
+  return {index: i, text: r.innerText || '', href: a ? (a.getAttribute('href') || '') : ''};
+});
+"""
+
+def grid_snapshot(drv) -> List[Dict]:
+    """ทุกแถวของหน้าปัจจุบันใน execute_script ครั้งเดียว: index, text, notification_no, target/argument ของ 'ดูข้อมูล'"""
+    out = []
+    for r in drv.execute_script(GRID_ROWS_JS) or []:
+        m = fda_http.POSTBACK_RE.search(r.get("href") or "")
+        out.append({"index": r["index"], "text": r["text"], "notification_no": notif_from_row_text(r["text"]),
+                    "target": m.group(1) if m else "", "argument": m.group(2) if m else ""})
+    return out
+
+def click_row_link(drv, index: int):
+    """คลิกลิงก์ 'ดูข้อมูล' ของแถวที่ index (ใช้เมื่อ href ไม่ใช่ __doPostBack ตรง ๆ)"""
+    drv.execute_script(_H_JS + """
+    var a = Array.prototype.filter.call((h.rows()[arguments[0]] || document).querySelectorAll("a[href*='__doPostBack']"),
+                                        function(x){ return (x.textContent || '').indexOf('ดูข้อมูล') >= 0; })[0];
+    if (!a) throw new Error('ไม่พบลิงก์ ดูข้อมูล แถว ' + arguments[0]);
+    a.scrollIntoView({block:'center'}); a.click();""", index)
+
+def w_visible(drv, xp, t=60):  return WebDriverWait(drv, t).until(EC.visibility_of_element_located((By.XPATH, xp)))
+
+def wait_ajax_idle(drv, timeout=60):
+    if not wait_event(drv, "h.idle()", timeout):
+        raise TimeoutException("AJAX ยังไม่ว่างภายในเวลาที่กำหนด")
+
+def grid_present(drv) -> bool:
+    return bool(
+        drv.find_elements(By.XPATH, "//table[contains(@class,'rgMasterTable')]/tbody") or
+        drv.find_elements(By.XPATH, "//td[contains(.,'No records to display')]") or
+        drv.find_elements(By.XPATH, "//*[contains(@class,'validation') or contains(@class,'validator') or contains(@class,'error')]")
+    )
+
+def open_search_with_retries(drv, retries=4):
+    for attempt in range(1, retries+1):
+        drv.get(URL)
+        try:
+            w_visible(drv, "//*[@id='ContentPlaceHolder1_txt_oper']", t=30 if attempt == 1 else 45)
+            w_visible(drv, "//*[@id='ContentPlaceHolder1_btn_sea_cmt']", t=10)
+            return True
+        except Exception:
+            log(f"[open] attempt {attempt}: element not ready -> refresh")
+            time.sleep(1.0 * attempt)
+            try: drv.refresh(); wait_ajax_idle(drv, 45)
+            except Exception: pass
+    return False
+
+SEARCH_FORM_JS = """
+var ids = ['ContentPlaceHolder1_txt_oper', 'ContentPlaceHolder1_Txt_fdpdtno', 'ContentPlaceHolder1_btn_sea_cmt'];
+return ids.every(function(i){ var el = document.getElementById(i); return el && !el.disabled && el.offsetParent !== null; });
+"""
+
+def search_form_ready(drv) -> bool:
+    """ฟอร์มค้นหาอยู่บนหน้าปัจจุบันและกดได้ (หน้าผลค้นหาครั้งก่อนก็มีฟอร์มนี้)"""
+    try: return bool(drv.execute_script(SEARCH_FORM_JS))
+    except WebDriverException: return False
+
+def open_search_form(drv, warm: bool = WARM_FORM) -> bool:
+    """warm = ฟอร์มยังอยู่ -> ใช้ต่อเลย; ไม่มีฟอร์ม (หน้ารายละเอียด / session หมดอายุ / หน้า error) -> โหลดหน้าค้นหาใหม่"""
+    if warm and search_form_ready(drv) and wait_event(drv, "h.idle()", 10): return True
+    return open_search_with_retries(drv)
+
+def click_search(drv):
+    # ติดป้ายตารางเดิมก่อนกด – ฟอร์มเดิม (warm) ตารางผลครั้งก่อนยังอยู่บนหน้า ต้องรอให้ถูกแทนที่ ไม่ใช่แค่มีแถว
+    drv.execute_script("var t = document.querySelector('table.rgMasterTable'); if (t) t.setAttribute('data-fda-stale', '1');")
+    btn = drv.find_element(By.ID, "ContentPlaceHolder1_btn_sea_cmt")
+    drv.execute_script("arguments[0].scrollIntoView({block:'center'}); arguments[0].click();", btn)
+    if not wait_event(drv, "!document.querySelector('table.rgMasterTable[data-fda-stale]') && h.idle()", 60):
+        raise TimeoutException("ผลค้นหายังไม่มาแทนตารางเดิมภายในเวลาที่กำหนด")
+
+def wait_for_rows(drv, timeout=120) -> int:
+    wait_ajax_idle(drv, min(60, timeout))
+    if not wait_event(drv, "h.rows().length > 0 || h.noRecords()", timeout):
+        raise TimeoutError("ตารางยังไม่โหลด ภายในเวลาที่กำหนด")
+    return int(drv.execute_script(_H_JS + "return h.rows().length;"))
+
+def page_val(drv) -> str:
+    els = drv.find_elements(By.XPATH, "//input[contains(@class,'rgCurrentPage')]")
+    return (els[0].get_attribute("value") or "").strip() if els else ""
+
+def next_exists(drv) -> bool:
+    return bool(
+        drv.find_elements(By.XPATH, "//input[contains(@class,'rgPageNext') and not(@disabled)]") or
+        drv.find_elements(By.XPATH, "//a[contains(@class,'rgPageNext') and not(contains(@class,'rgDisabled'))]")
+    )
+
+GRID_CHANGED_JS = "(h.firstRowKey() !== args[0] || h.pageVal() !== args[1]) && h.idle()"
+
+def go_next(drv, retries: int = 3) -> bool:
+    for attempt in range(1, retries + 1):
+        before = grid_key(drv)
+        btns = (drv.find_elements(By.XPATH, "//input[contains(@class,'rgPageNext') and not(@disabled)]")
+                or drv.find_elements(By.XPATH, "//a[contains(@class,'rgPageNext') and not(contains(@class,'rgDisabled'))]"))
+        if not btns: return False
+        drv.execute_script("arguments[0].scrollIntoView({block:'center'}); arguments[0].click();", btns[0])
+        if not wait_event(drv, GRID_CHANGED_JS, 45 if FAST_MODE else 60, *before):
+            if attempt < retries: continue
+            return False
+        wait_for_rows(drv)
+        log(f"  -> ไปหน้า {page_val(drv)} แล้ว (attempt {attempt})")
+        return True
+    return False
+
+PAGE_SIZE_JS = """
+var g = document.querySelector('div.RadGrid'), o = (g && window.$find) ? $find(g.id) : null;
+if (!o || !o.get_masterTableView) return false;
+var t = o.get_masterTableView();
+if (t.get_pageSize && t.get_pageSize() >= arguments[0]) return 'same';
+t.set_pageSize(arguments[0]); return 'set';
+"""
+
+def set_page_size(drv, size: int = PAGE_SIZE):
+    """ตั้งแถวต่อหน้าของ RadGrid ด้วย client API (tableView.set_pageSize = เลือกใน combo ขนาดหน้า) – มีหน้าเดียวอยู่แล้ว = ไม่ต้อง"""
+    if size <= 0 or not next_exists(drv): return
+    before = int(drv.execute_script(_H_JS + "return h.rows().length;"))
+    try: fired = drv.execute_script(PAGE_SIZE_JS, size)
+    except WebDriverException: fired = False
+    if fired == "same": return  # ฟอร์มเดิม: grid จำขนาดหน้าไว้ใน ViewState แล้ว
+    if not fired:
+        log("  -> ตั้งขนาดหน้าไม่ได้ (ไม่พบ RadGrid client object) -> ใช้ขนาดหน้าเดิม"); return
+    if wait_event(drv, "h.rows().length > args[0] && h.idle()", 60, before):
+        log(f"  -> ขนาดหน้า {size} แถว: ทั้งหมด {page_count(drv) or '?'} หน้า")
+    else:
+        log(f"  -> เว็บไม่รับขนาดหน้า {size} -> ใช้ขนาดหน้าเดิม ({before} แถว)")
+
+SORT_JS = """
+var g = document.querySelector('div.RadGrid'), o = (g && window.$find) ? $find(g.id) : null;
+if (!o || !o.get_masterTableView) return false;
+var t = document.querySelector('table.rgMasterTable'); if (t) t.setAttribute('data-fda-stale', '1');
+o.get_masterTableView().sort(arguments[0] + ' DESC'); return true;
+"""
+
+def sorted_desc(drv) -> bool:
+    return bool(drv.find_elements(By.XPATH, fda_http.SORTED_DESC_XP))
+
+def set_sort_desc(drv):
+    """เรียงผลใหม่สุดก่อนด้วย client API (tableView.sort = คลิกหัวคอลัมน์) – หน้าเดียว / เรียงอยู่แล้ว = ไม่ต้อง"""
+    if not NEWEST_FIRST or not next_exists(drv) or sorted_desc(drv): return
+    field = fda_http.pick_sort_field([(a.text, a.get_attribute("onclick") or "")
+                                      for a in drv.find_elements(By.XPATH, fda_http.HEADER_LINK_XP)])
+    try: fired = bool(field) and drv.execute_script(SORT_JS, field)
+    except WebDriverException: fired = False
+    if not fired:
+        log("  -> เรียงผลไม่ได้ (ไม่พบคอลัมน์/RadGrid client object) -> ใช้ลำดับเดิมของเว็บ"); return
+    if wait_event(drv, "!document.querySelector('table.rgMasterTable[data-fda-stale]') && h.idle()", 60) and sorted_desc(drv):
+        log(f"  -> เรียงตาม {field} ใหม่สุดก่อน")
+    else:
+        log(f"  -> เว็บไม่เรียงตาม {field} -> ใช้ลำดับเดิมของเว็บ")
+
+def page_count(drv) -> int:
+    """จำนวนหน้าทั้งหมดจากข้อความ pager (rgInfoPart) – 0 = ไม่ทราบ"""
+    return fda_http.pager_value((el.text for el in drv.find_elements(By.XPATH, fda_http.PAGER_INFO_XP)), fda_http.PAGES_RES)
+
+def result_count(drv) -> int:
+    """จำนวนผลทั้งหมดจากข้อความ pager ('N items in M pages') – 0 = ไม่ทราบ"""
+    return fda_http.pager_value((el.text for el in drv.find_elements(By.XPATH, fda_http.PAGER_INFO_XP)), fda_http.ITEMS_RES)
+
+def go_to_page(drv, k: int, retries: int = 3) -> bool:
+    """กระโดดไปหน้า k: ลิงก์ตัวเลขใน pager -> ช่อง rgCurrentPage + ปุ่ม Go/Enter -> ไม่ได้จริง ๆ ค่อยกด next ทีละหน้า"""
+    if k <= 1 or page_val(drv) == str(k): return True
+    for attempt in range(1, retries + 1):
+        before = grid_key(drv)
+        links = drv.find_elements(By.XPATH, f"//*[contains(@class,'rgNumPart')]//a[normalize-space(.)='{k}']")
+        boxes = drv.find_elements(By.XPATH, "//input[contains(@class,'rgCurrentPage')]")
+        if links:
+            drv.execute_script("arguments[0].click();", links[0])
+        elif boxes:
+            drv.execute_script("arguments[0].value = arguments[1];", boxes[0], str(k))
+            go = boxes[0].find_elements(By.XPATH, "following::input[(@type='submit' or @type='button') and (contains(@class,'rgPagerButton') or @value='Go')][1]")
+            if go: drv.execute_script("arguments[0].click();", go[0])
+            else: boxes[0].send_keys(Keys.ENTER)
+        else:
+            break
+        if not wait_event(drv, GRID_CHANGED_JS, 45 if FAST_MODE else 60, *before): continue
+        wait_for_rows(drv)
+        if page_val(drv) in (str(k), ""):
+            log(f"  -> กระโดดไปหน้า {k} แล้ว (attempt {attempt})"); return True
+    log(f"  -> กระโดดไปหน้า {k} ไม่ได้ -> กด next ทีละหน้า")
+    while page_val(drv) != str(k):
+        if not (next_exists(drv) and go_next(drv)): return False
+    return True
+
+# ---------- Utils ----------
+def align_new_changes_strict(df_report, keep_status=True):
+    status_col = "สถานะ"
+    df = df_report.copy().rename(columns=TH_HEADERS)
+    strict_cols = ([status_col] if (keep_status and status_col in df.columns) else []) + BASE_HEADERS
+    for col in strict_cols:
+        if col not in df.columns: df[col] = ""
+    return df.reindex(columns=strict_cols)
+
+def safe_name(s: str) -> str:
+    s = re.sub(r"[\\/:*?\"<>|\r\n]+","_", s).strip()
+    return re.sub(r"\s+"," ", s)
+
+def search_years() -> List[str]:
+    """ปีที่ต้องค้น: ALLOW_YY มีหลายปี = ค้นครั้งเดียวรวมทุกปี (ALL_YY) แทนการวนค้นทีละปี"""
+    return [ALL_YY] if len(ALLOW_YY) > 1 else sorted(ALLOW_YY)
+
+def yy_label(yy2: str) -> str:
+    return yy2 or "+".join(sorted(ALLOW_YY))
+
+def valid_pos45(no: str) -> bool:
+    s = (no or "").strip()
+    toks = [t for t in re.split(r"\D+", s) if t]
+    if len(toks) >= 3:
+        seg3 = toks[2]
+        return any(seg3.startswith(yy) for yy in ALLOW_YY)
+    return False
+
+# ---------- Search ----------
+def ensure_on_grid(drv, kind: str, query: str, yy2: str, max_back=2):
+    for _ in range(max_back):
+        if grid_present(drv): return
+        try: drv.back(); wait_ajax_idle(drv, 60)
+        except Exception: break
+        if grid_present(drv): return
+    fill_and_search(drv, kind, query, yy2)  # โหลดหน้าค้นหาใหม่เฉพาะเมื่อไม่มีฟอร์มบนหน้า
+
+def on_first_page(drv) -> bool:
+    """ค้นจากฟอร์มเดิมแล้ว grid ต้องกลับมาหน้า 1 – ถ้าเว็บจำเลขหน้าเดิมไว้ ให้โหลดหน้าค้นหาใหม่แล้วค้นอีกครั้ง"""
+    if page_val(drv) in ("", "1"): return True
+    log(f"  -> ค้นจากฟอร์มเดิมแล้วค้างที่หน้า {page_val(drv)} -> โหลดหน้าค้นหาใหม่")
+    open_search_with_retries(drv)
+    return False
+
+def fill_and_search(drv, kind: str, query: str, yy2: str):
+    (fill_and_search_brand if kind == "brand" else fill_and_search_operator)(drv, query, yy2)
+
+def fill_and_search_operator(drv, operator: str, yy2: str):
+    if not open_search_form(drv):
+        raise RuntimeError("เปิดหน้า Search ไม่สำเร็จหลัง retry หลายครั้ง")
+    for attempt in range(1, 4):
+        try:
+            op = drv.find_element(By.ID, "ContentPlaceHolder1_txt_oper")
+            yy = drv.find_element(By.ID, "ContentPlaceHolder1_Txt_fdpdtno")
+            brand_el = (drv.find_elements(By.ID, "ContentPlaceHolder1_txt_trade") or
+                        drv.find_elements(By.ID, "ContentPlaceHolder1_txt_tradename") or [])
+        except Exception:
+            try: drv.get(URL); wait_ajax_idle(drv, 60)
+            except Exception: pass
+            continue
+        try:
+            drv.execute_script("arguments[0].value = '';", op)
+            drv.execute_script("arguments[0].value = '';", yy)
+            for el in brand_el:
+                try: drv.execute_script("arguments[0].value='';", el)
+                except: pass
+        except Exception: pass
+        try:
+            op.send_keys(operator[:2]); yy.send_keys(yy2)
+            drv.execute_script("arguments[0].value = arguments[1];", op, operator)
+        except Exception: continue
+
+        try:
+            click_search(drv)
+            n = wait_for_rows(drv, timeout=120 if attempt == 1 else 180)
+            if not on_first_page(drv): continue
+            log(f"  -> โหลดตารางแล้ว {n} แถว (ปี {yy_label(yy2)})")
+            set_page_size(drv); set_sort_desc(drv); return
+        except (TimeoutException, TimeoutError):
+            log(f"[fill_and_search] Timeout (attempt {attempt}) -> refresh")
+            open_search_with_retries(drv)
+        except Exception as e:
+            log(f"[fill_and_search] unexpected: {e}")
+    raise RuntimeError(f"ค้นหาไม่สำเร็จหลายครั้ง: {operator} (ปี {yy_label(yy2)})")
+
+def _find_brand_input(drv):
+    for i in fda_http.BRAND_INPUT_IDS:
+        el = drv.find_elements(By.ID, i)
+        if el: return el[0]
+    for xp in fda_http.BRAND_INPUT_XPS:
+        els = drv.find_elements(By.XPATH, xp)
+        if els: return els[0]
+    txts = drv.find_elements(By.XPATH, fda_http.TEXT_INPUT_XP)
+    return txts[1] if len(txts) >= 2 else None
+
+def fill_and_search_brand(drv, brand: str, yy2: str):
+    if not open_search_form(drv):
+        raise RuntimeError("เปิดหน้า Search ไม่สำเร็จหลัง retry หลายครั้ง")
+    for attempt in range(1, 4):
+        try:
+            op = drv.find_element(By.ID, "ContentPlaceHolder1_txt_oper")
+            yy = drv.find_element(By.ID, "ContentPlaceHolder1_Txt_fdpdtno")
+            br = _find_brand_input(drv)
+            if br is None: raise RuntimeError("หา input 'ชื่อการค้า' ไม่พบ")
+        except Exception:
+            try: drv.get(URL); wait_ajax_idle(drv, 60)
+            except Exception: pass
+            continue
+        try:
+            for el in (op, yy, br):
+                try: drv.execute_script("arguments[0].value='';", el)
+                except: pass
+        except Exception: pass
+        try:
+            br.send_keys(brand[:2]); yy.send_keys(yy2)
+            drv.execute_script("arguments[0].value = arguments[1];", br, brand)
+        except Exception: continue
+
+        try:
+            click_search(drv)
+            n = wait_for_rows(drv, timeout=120 if attempt == 1 else 180)
+            if not on_first_page(drv): continue
+            log(f"  -> โหลดตารางแล้ว {n} แถว (ยี่ห้อ '{brand}', ปี {yy_label(yy2)})")
+            set_page_size(drv); set_sort_desc(drv); return
+        except (TimeoutException, TimeoutError):
+            log(f"[fill_and_search_brand] Timeout (attempt {attempt}) -> refresh")
+            open_search_with_retries(drv)
+        except Exception as e:
+            log(f"[fill_and_search_brand] unexpected: {e}")
+    raise RuntimeError(f"ค้นหาไม่สำเร็จหลายครั้ง (ยี่ห้อ): {brand} (ปี {yy_label(yy2)})")
+
+
+# ---------- เปิดรายละเอียด ----------
+DETAIL_JS = """
+var ids = arguments[0], out = {};
+for (var k in ids) { var el = document.getElementById(ids[k]); out[k] = el ? (el.innerText || el.textContent || '') : ''; }
+return out;
+"""
+
+def read_detail(drv) -> Dict[str, str]:
+    """อ่าน label ContentPlaceHolder1_lb_* ทั้งหมดใน execute_script ครั้งเดียว คืน dict ตามชื่อคอลัมน์ใน COLS"""
+    return _detail_rec(drv.execute_script(DETAIL_JS, fda_http.DETAIL_IDS) or {})
+
+def _detail_rec(raw: Dict) -> Dict[str, str]:
+    rec = {col: " ".join((raw.get(col) or "").split()) for col in fda_http.DETAIL_IDS}
+    rec["skus"] = ""
+    rec["notification_year_be_last2"] = year_from_no(rec.get("notification_no",""))
+    return rec
+
+IFRAME_DETAILS_JS = r"""
+var rows = arguments[0], ids = arguments[1], limit = arguments[2], ms = arguments[3], done = arguments[arguments.length - 1];
+var f = document.forms[0], origTarget = f.target, results = [], next = 0, active = 0, finished = 0;
+if (!rows.length) { done([]); return; }
+function field(n){
+  var el = document.getElementsByName(n)[0];
+  if (!el) { el = document.createElement('input'); el.type = 'hidden'; el.name = n; el.id = n; f.appendChild(el); }
+  return el;
+}
+function read(d){ var out = {}; for (var k in ids) { var el = d.getElementById(ids[k]); out[k] = el ? (el.innerText || el.textContent || '') : ''; } return out; }
+function launch(){
+  while (active < limit && next < rows.length) { active++; open(next++); }
+}
+function open(i){
+  var name = 'fda_detail_' + i, fr = document.createElement('iframe'), hops = 0, settled = false;
+  var timer = setTimeout(function(){ finish(null); }, ms);
+  function finish(v){
+    if (settled) return; settled = true; clearTimeout(timer);
+    results[i] = v; if (fr.parentNode) fr.parentNode.removeChild(fr);
+    active--; finished++;
+    if (finished === rows.length) done(results); else launch();
+  }
+  fr.name = name;
+  fr.style.cssText = 'position:absolute;left:-10000px;top:0;width:800px;height:600px;visibility:hidden;border:0';
+  document.body.appendChild(fr);
+  fr.onload = function(){
+    try {
+      var d = fr.contentDocument;
+      if (d.getElementById(ids.notification_no)) return finish(read(d));
+      var m = (d.documentElement.innerHTML || '').match(/window\.open\(\s*['"]([^'"]+)['"]/);
+      if (m && hops++ < 2) { fr.src = new URL(m[1], d.URL).href; return; }
+    } catch(e) {}
+    finish(null);
+  };
+  f.target = name;
+  field('__EVENTTARGET').value = rows[i].target; field('__EVENTARGUMENT').value = rows[i].argument || '';
+  f.submit();
+  f.target = origTarget; field('__EVENTTARGET').value = ''; field('__EVENTARGUMENT').value = '';
+}
+launch();
+"""
+
+def fetch_details_iframe(drv, rows: List[Dict], limit: int, timeout: int = 60) -> List[Optional[Dict]]:
+    """ยิง postback 'ดูข้อมูล' ลง iframe ซ่อนในหน้า grid (พร้อมกันสูงสุด limit) – Chrome ไม่ออกจาก grid หน้าเดิม
+    คืนผลตามลำดับ rows (None = แถวที่โหลดไม่สำเร็จ/หมดเวลา)"""
+    base, before = drv.current_window_handle, set(drv.window_handles)
+    limit = max(1, limit)
+    drv.set_script_timeout(timeout * (len(rows) // limit + 2))
+    try:
+        raw = drv.execute_async_script(IFRAME_DETAILS_JS, [{"target": r["target"], "argument": r["argument"]} for r in rows],
+                                       fda_http.DETAIL_IDS, limit, timeout * 1000)
+    finally:
+        drv.set_script_timeout(300)
+        for hnd in set(drv.window_handles) - before:  # หน้ารายละเอียดที่ยังเรียก window.open เอง
+            drv.switch_to.window(hnd); drv.close()
+        drv.switch_to.window(base)
+    out = []
+    for row, r in zip(rows, raw or [None] * len(rows)):
+        if r: log(f"     ✓ ดึงแล้ว (iframe): {row['notification_no']}")
+        else: log(f"     ! เปิดรายละเอียดไม่สำเร็จ (iframe): {row['notification_no']}")
+        out.append(_detail_rec(r) if r else None)
+    return out
+
+
+def open_detail_and_back(drv, row: Dict, kind: str, query: str, yy2: str) -> Dict[str, str]:
+    """row = แถวจาก grid_snapshot – ยิง __doPostBack ของแถวนั้นตรง ๆ (ไม่มี href -> คลิกลิงก์ตาม index)"""
+    base = drv.current_window_handle
+    before = set(drv.window_handles)
+    if row.get("target"):
+        target, arg = row["target"], row.get("argument", "")
+        js = """
+        (function(target,arg){
+          var f=document.forms[0];
+          function ensure(n){var el=document.getElementsByName(n)[0]; if(!el){el=document.createElement('input');el.type='hidden';el.name=n;el.id=n;f.appendChild(el);} return el;}
+          ensure('__EVENTTARGET').value   = target||'';
+          ensure('__EVENTARGUMENT').value = arg||'';
+          f.submit();
+        })(arguments[0],arguments[1]);
+        """
+        drv.execute_script(js, target, arg)
+    else:
+        click_row_link(drv, row["index"])
+
+    # popup เปิดหน้าต่างใหม่ JS ในหน้าเดิมมองไม่เห็น จึงยัง poll window_handles แต่ถี่ (50ms) แทนค่า default 500ms
+    try:
+        WebDriverWait(drv, 30, poll_frequency=0.05).until(
+            lambda d: len(d.window_handles) > len(before) or d.find_elements(By.ID, "ContentPlaceHolder1_lb_no_regnos")
+        )
+    except Exception:
+        click_row_link(drv, row["index"])
+        WebDriverWait(drv, 30, poll_frequency=0.05).until(
+            lambda d: len(d.window_handles) > len(before) or d.find_elements(By.ID, "ContentPlaceHolder1_lb_no_regnos")
+        )
+
+    after = set(drv.window_handles)
+    opened_new = len(after) > len(before)
+    if opened_new: drv.switch_to.window((after - before).pop())
+
+    try:
+        if not wait_event(drv, "!!document.getElementById('ContentPlaceHolder1_lb_no_regnos') && "
+                               "!!document.getElementById('ContentPlaceHolder1_lb_status') && h.idle()", 45 if FAST_MODE else 60):
+            raise TimeoutException("ไม่พบ label รายละเอียด (lb_no_regnos/lb_status)")
+    except Exception as e:
+        try:
+            if opened_new: drv.close(); drv.switch_to.window(base)
+        finally:
+            ensure_on_grid(drv, kind, query, yy2)
+        raise DetailOpenError(str(e))
+
+    rec = read_detail(drv)
+
+    if opened_new: drv.close(); drv.switch_to.window(base)
+    else: drv.back()
+    wait_ajax_idle(drv, 60); ensure_on_grid(drv, kind, query, yy2); wait_for_rows(drv)
+    log(f"     ✓ ดึงแล้ว: {rec.get('notification_no','')}")
+    return rec
+
+
+def remember(rec: Dict):
+    """เก็บ record ที่เพิ่งดึงลง RECORD_STORE (ไม่มีคอลัมน์ query) – query อื่นในรอบเดียวกันที่เจอเลขนี้ไม่ต้องเปิดซ้ำ"""
+    no = rec.get("notification_no", "") if rec else ""
+    if no: RECORD_STORE[no] = {c: rec.get(c, "") for c in COLS}
+
+# ---------- Scrape (grid) ----------
+def scrape_page_concurrent(drv, kind: str, query: str, yy2: str) -> List[Dict]:
+    """ยิง postback 'ดูข้อมูล' ทุกแถวของหน้านี้พร้อมกัน (HTTP ด้วย cookie/state ของ Chrome หรือ iframe ซ่อน) โดยไม่ออกจากหน้า grid"""
+    global _DETAIL_SESS
+    wait_for_rows(drv)
+    todo = [r for r in grid_snapshot(drv) if r["notification_no"] and r["target"] and fda_http.year_ok(r["notification_no"], yy2, ALLOW_YY)]
+    if not todo: return []
+    fresh = [r for r in todo if r["notification_no"] not in RECORD_STORE]
+    if fresh:
+        if DETAIL_MODE == "iframe":
+            got = fetch_details_iframe(drv, fresh, DETAIL_CONCURRENCY)
+        else:
+            _DETAIL_SESS = fda_http.session_from_driver(drv, _DETAIL_SESS)
+            got = fda_http.fetch_details(_DETAIL_SESS, fda_http.driver_form_state(drv), fresh, DETAIL_CONCURRENCY)
+        got = list(got)
+        for j, (row, rec) in enumerate(zip(fresh, got)):
+            if rec or not any(got): continue  # ล้มทั้งหน้า -> กลับไปเปิดทีละแถวด้านล่าง
+            log(f"     ! {row['notification_no']} ดึงพร้อมกันไม่สำเร็จ -> เปิดทีละแถว")
+            try: got[j] = open_detail_and_back(drv, row, kind, query, yy2)
+            except Exception as e: log(f"     ! เปิดรายละเอียดไม่สำเร็จ (ข้ามแถวนี้) : {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+        for rec in got: remember(rec)
+    else: got = []
+    if len(todo) > len(fresh): log(f"     ↺ ใช้ record ในเครื่อง {len(todo) - len(fresh)} แถว (เคยเห็นแล้ว)")
+    it, fresh_nos = iter(got), {r["notification_no"] for r in fresh}
+    recs = [next(it) if r["notification_no"] in fresh_nos else dict(RECORD_STORE[r["notification_no"]]) for r in todo]
+    if fresh and not any(got):
+        log("     ! ดึงพร้อมกันไม่สำเร็จทั้งหน้า -> กลับไปเปิดทีละแถว")
+        return scrape_page(drv, kind, query, yy2, concurrent=False)
+    qcol = QUERY_KINDS[kind]["col"]
+    out = []
+    for rec in recs:
+        if rec and valid_pos45(rec.get("notification_no","")):
+            rec[qcol] = query; out.append(rec)
+    return out
+
+def scrape_page(drv, kind: str, query: str, yy2: str, concurrent: bool = True) -> List[Dict]:
+    if concurrent and (DETAIL_MODE == "iframe" or (DETAIL_MODE == "http" and DETAIL_CONCURRENCY > 1)):
+        return scrape_page_concurrent(drv, kind, query, yy2)
+    qcol = QUERY_KINDS[kind]["col"]
+    out: List[Dict] = []
+    wait_for_rows(drv)
+    rows = grid_snapshot(drv); n = len(rows); i = 1
+    while i <= n:
+        row = rows[i - 1]; no = row["notification_no"]
+        if not no or not fda_http.year_ok(no, yy2, ALLOW_YY): i += 1; continue
+        if no in RECORD_STORE:
+            log(f"  -> ↺ {no} เคยเห็นแล้ว ใช้ record ในเครื่อง | row={i}/{n}")
+            out.append(dict(RECORD_STORE[no], **{qcol: query})); i += 1; continue
+        try:
+            log(f"  -> CLICK ดูข้อมูล | เลขจดแจ้ง={no} | row={i}/{n}")
+            rec = open_detail_and_back(drv, row, kind, query, yy2); remember(rec)
+            if valid_pos45(rec.get("notification_no","")):
+                rec[qcol] = query; out.append(rec)
+            i += 1
+        except DetailOpenError as e:
+            log(f"     ! เปิดรายละเอียดไม่สำเร็จ (ข้ามแถวนี้) : {str(e).splitlines()[0]}"); i += 1; continue
+        except Exception as e:
+            msg = getattr(e, "msg", str(e)); first = msg.splitlines()[0] if isinstance(msg, str) and msg else str(type(e).__name__)
+            log(f"     ! ซิงค์ตารางใหม่ (i={i}/{n}) : {first}")
+            wait_ajax_idle(drv, 60); ensure_on_grid(drv, kind, query, yy2); wait_for_rows(drv)
+            rows = grid_snapshot(drv); n = len(rows); continue
+    return out
+
+def _split_years(drv, kind: str, query: str, total: int, first: int) -> List[Dict]:
+    """ค้นรวมทุกปีแล้วชน RESULT_CAP -> ค้นใหม่ทีละปี (ทั้งหมดทำใน shard ที่เริ่มหน้า 1, shard อื่นคืนว่าง)"""
+    log(f"  -> ค้นรวม {yy_label(ALL_YY)} ได้ {total:,} รายการ ชนเพดาน {RESULT_CAP:,} -> แยกค้นทีละปี")
+    if first > 1: return []
+    return [r for yy2 in sorted(ALLOW_YY) for r in _scrape_pages(drv, kind, query, yy2, 1, None)]
+
+def _fp_db():
+    """connection ของ fingerprint (เปิดใหม่ต่อ process) – FP_PATH ว่าง = None"""
+    if not FP_PATH: return None
+    if _FP["conn"] is None or _FP["pid"] != os.getpid():
+        _FP["conn"], _FP["pid"] = open_fingerprints(FP_PATH), os.getpid()
+    return _FP["conn"]
+
+def _seen_idx():
+    """ดัชนีเลขจดแจ้งที่เคยเห็น (เปิดใหม่ต่อ process) – ไม่ใช้โหมด NEWEST_FIRST / ดัชนียังว่าง = None"""
+    if not SEEN_PATH: return None
+    if _SEEN["pid"] != os.getpid():
+        idx = open_seen(SEEN_PATH)
+        _SEEN["idx"], _SEEN["pid"] = (idx if len(idx) else None), os.getpid()
+    return _SEEN["idx"]
+
+def page_nos(drv, yy2: str) -> List[str]:
+    """เลขจดแจ้งของหน้าปัจจุบันที่อยู่ในปีที่ต้องการ"""
+    return [r["notification_no"] for r in grid_snapshot(drv) if r["notification_no"] and fda_http.year_ok(r["notification_no"], yy2, ALLOW_YY)]
+
+def _fp_check(kind: str, query: str, yy2: str, total: int, first_nos: List[str]) -> Optional[List[Dict]]:
+    """เทียบหน้าแรกกับ fingerprint รอบก่อน – ไม่เปลี่ยน = records เดิม (ไม่ต้องไล่หน้า/เปิดรายละเอียด), เปลี่ยน = None"""
+    fp = fp_get(_fp_db(), f"{kind}|{query}|{yy2}")
+    if not fp_unchanged(fp, total, first_nos): return None
+    log(f"  -> ปี {yy_label(yy2)}: ผลค้นหาไม่เปลี่ยน ({total:,} รายการ) -> ใช้ผลรอบก่อน ไม่ไล่หน้า/ไม่เปิดรายละเอียด")
+    FP_SKIPS[(kind, query)] += 1
+    return fp[1]
+
+def _scrape_pages(drv, kind: str, query: str, yy2: str, first: int, last: Optional[int]) -> List[Dict]:
+    """วนหน้า first..last ของการค้นหาปี yy2 (ALL_YY = ค้นรวมทุกปี) – หน้าที่ journal บอกว่าเสร็จแล้ว (โหมด --resume) ไม่ต้องดึงซ้ำ
+    ค้นเต็ม (หน้า 1 จนจบ) ใช้/บันทึก fingerprint: หน้าแรกตรงกับรอบก่อน = คืนผลรอบก่อนทันที"""
+    qcol = QUERY_KINDS[kind]["col"]
+    done, start = journal_resume(kind, query, yy2, first, last)
+    results = [dict(r, **{qcol: query}) for r in done]
+    if start is None: return results
+    use_fp = _fp_db() is not None and start == 1 and last is None
+    seen = {"total": 0, "same": False, "stopped": False, "had_nos": False}  # จำนวนผลจาก pager / หน้าแรกตรงกับ fingerprint / หยุดกลางทาง / เคยเจอแถวปีที่ติดตาม
+    def on_page(page, recs, end):
+        PAGE_HOPS[(kind, query)] += 1
+        journal_write({"ev": "page", "k": kind, "q": query, "yy": yy2, "page": page, "ps": GRID_PAGE_SIZE, "ord": GRID_ORDER,
+                       "rows": len(recs), "end": end, "recs": recs})
+    def stop_known(page, nos):
+        if not nos:  # เรียงใหม่สุดก่อน: หน้าที่ไม่มีปีที่ติดตามแล้วหลังจากเคยมี = ที่เหลือเป็นปีเก่ากว่าทั้งหมด (โหมดค้นรวมทุกปี)
+            if not seen["had_nos"]: return False
+            log(f"  -> หน้า {page}: ไม่มีเลขจดแจ้งของปี {yy_label(yy2)} แล้ว -> หยุดไล่หน้า (เรียงใหม่สุดก่อน)")
+            seen["stopped"] = True
+            return True
+        seen["had_nos"] = True
+        idx = _seen_idx()
+        if idx is None or idx.missing(nos): return False
+        log(f"  -> หน้า {page}: เลขจดแจ้งทั้ง {len(nos)} รายการเคยเห็นแล้ว -> หยุดไล่หน้า (เรียงใหม่สุดก่อน)")
+        seen["stopped"] = True
+        return True
+    def unchanged(total, first_nos):
+        seen["total"] = total
+        same = _fp_check(kind, query, yy2, total, first_nos)
+        if same is not None: seen["same"] = True; on_page(1, same, True)
+        return same
+    def finish(recs):
+        if use_fp and seen["total"] and not seen["same"] and not seen["stopped"]:  # ผลไม่ครบ (หยุดกลางทาง) ไม่ใช้เป็น fingerprint
+            fp_put(_fp_db(), f"{kind}|{query}|{yy2}", seen["total"], [{c: r.get(c, "") for c in COLS} for r in recs])
+        return results + [dict(r, **{qcol: query}) for r in recs]
+    if ENGINE == "http":
+        try:
+            return finish(fda_http.scrape_query_pages(drv, kind, query, yy2, start, last, ALLOW_YY, DETAIL_CONCURRENCY,
+                                                      RECORD_STORE, on_page, RESULT_CAP, unchanged if use_fp else None,
+                                                      stop_known if NEWEST_FIRST else None))
+        except fda_http.ResultCapped as e:
+            return results + _split_years(drv, kind, query, e.args[0], first)
+    fill_and_search(drv, kind, query, yy2)
+    if yy2 == ALL_YY and RESULT_CAP and result_count(drv) >= RESULT_CAP:
+        return results + _split_years(drv, kind, query, result_count(drv), first)
+    if drv.find_elements(By.XPATH, "//td[contains(.,'No records to display')]"):
+        log(f"  -> ปี {yy_label(yy2)}: ไม่มีข้อมูล"); on_page(start, [], True); return results
+    if use_fp:
+        same = unchanged(result_count(drv), page_nos(drv, yy2))
+        if same is not None: return finish(same)
+    if not go_to_page(drv, start): return results
+    page, recs_all = start, []
+    while True:
+        if NEWEST_FIRST and sorted_desc(drv) and stop_known(page, page_nos(drv, yy2)):
+            on_page(page, [], True); break
+        recs = scrape_page(drv, kind, query, yy2); recs_all.extend(recs)
+        at_last = bool(last and page >= last)
+        more = not at_last and next_exists(drv) and go_next(drv)
+        on_page(page, recs, not more and not at_last)
+        if not more: break
+        page += 1
+    return finish(recs_all)
+
+def scrape_query(drv, kind: str, query: str) -> List[Dict]:
+    label = QUERY_KINDS[kind]["label"]
+    log(f"Start ({label}): {query}")
+    results: List[Dict] = []
+    PAGE_HOPS[(kind, query)] = 0
+    for yy2 in search_years():
+        results.extend(_scrape_pages(drv, kind, query, yy2, 1, None))
+    log(f"Done ({label}): {query} -> {len(results)} แถว, {PAGE_HOPS[(kind, query)]} หน้า (ขนาดหน้า {GRID_PAGE_SIZE})")
+    return results
+
+def scrape_query_pages(drv, kind: str, query: str, yy2: str, first: int, last: Optional[int] = None) -> List[Dict]:
+    """ดึงเฉพาะช่วงหน้า first..last (last=None = จนหน้าสุดท้าย) ของการค้นหาปี yy2 – ใช้แบ่งงานใหญ่ให้หลาย worker"""
+    label = QUERY_KINDS[kind]["label"]
+    log(f"Start ({label}): {query} | ปี {yy_label(yy2)} หน้า {first}-{last or 'จบ'}")
+    PAGE_HOPS[(kind, query)] = 0
+    results = _scrape_pages(drv, kind, query, yy2, first, last)
+    log(f"Done ({label}): {query} หน้า {first}-{last or 'จบ'} -> {len(results)} แถว, {PAGE_HOPS[(kind, query)]} หน้า (ขนาดหน้า {GRID_PAGE_SIZE})")
+    return results
+
+# ---------- Journal (checkpoint / --resume) ----------
+def journal_write(ev: Dict):
+    """append 1 บรรทัด JSON แล้ว fsync – crash กลางทางเสียแค่บรรทัดสุดท้ายที่เขียนไม่จบ"""
+    if not JOURNAL_PATH: return
+    with open(JOURNAL_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(ev, ensure_ascii=False) + "\n"); f.flush(); os.fsync(f.fileno())
+
+def load_journal(path: str) -> Dict:
+    state = {"done": set(), "pages": {}}  # done = {(ชนิด, ชื่อ)}; pages[(ชนิด, ชื่อ, ปี)][หน้า] = (records, หน้าสุดท้ายหรือไม่)
+    try: f = open(path, "rb+")
+    except OSError: return state
+    with f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):  # ถูก kill กลางบรรทัด: ตัดเศษทิ้ง ไม่ให้ event ถัดไปต่อท้ายบรรทัดที่ขาด
+            f.truncate(data.rfind(b"\n") + 1)
+            log(f"[resume] ตัดบรรทัดสุดท้ายที่เขียนไม่จบออกจาก {path}")
+        for line in data.decode("utf-8", "replace").splitlines():
+            try: ev = json.loads(line)
+            except ValueError: continue
+            if ev.get("ev") == "done": state["done"].add((ev.get("k", ""), ev["q"]))
+            elif ev.get("ev") == "page" and ev.get("ps", GRID_PAGE_SIZE) == GRID_PAGE_SIZE and ev.get("ord", "") == GRID_ORDER:  # เลขหน้าใช้ได้เฉพาะขนาดหน้า/ลำดับเดียวกัน
+                state["pages"].setdefault((ev.get("k", ""), ev["q"], ev["yy"]), {})[ev["page"]] = (ev.get("recs") or [], bool(ev.get("end")))
+    return state
+
+def journal_resume(kind: str, name: str, yy2: str, first: int, last: Optional[int]) -> Tuple[List[Dict], Optional[int]]:
+    """(records ของหน้าที่เสร็จต่อเนื่องจาก first, หน้าที่ต้องเริ่มต่อ) – หน้าเริ่มต่อ None = ช่วงนี้เสร็จครบแล้ว"""
+    pages = JOURNAL["pages"].get((kind, name, yy2), {})
+    recs, p = [], first
+    while p in pages:
+        rows, end = pages[p]; recs.extend(rows)
+        if end or (last and p >= last): return recs, None
+        p += 1
+    if p > first: log(f"  -> [resume] {name} ปี {yy_label(yy2)}: ข้าม {p - first} หน้าที่เสร็จแล้ว เริ่มที่หน้า {p}")
+    return recs, p
+
+# ---------- Seen storage & email ----------
+def collect_operator_names(df: pd.DataFrame) -> set:
+    cols = [c for c in df.columns if c in ("operator_name", "ชื่อผู้ประกอบการ")]
+    if not cols: return set()
+    col = cols[0]
+    return set(str(x).strip() for x in df[col].dropna().astype(str).tolist() if str(x).strip())
+
+def collect_items(df: pd.DataFrame) -> list:
+    if df is None or df.empty: return []
+    rev_map = {v: k for k, v in TH_HEADERS.items()}
+    tmp = df.copy().rename(columns=rev_map)
+    out = []
+    for _, r in tmp.iterrows():
+        row = {}
+        for k in COLS:
+            row[k] = (str(r[k]).strip() if (k in r and pd.notna(r[k])) else "")
+        if row.get("notification_no") and not row.get("notification_year_be_last2"):
+            row["notification_year_be_last2"] = year_from_no(row["notification_no"])
+        out.append(row)
+    return out
+
+def baseline_frames(dirpath: str, columns: Optional[List[str]] = None):
+    """DataFrame ของผลลัพธ์เดิมในโฟลเดอร์: <dirpath>/_store (Parquet ก้อนเดียว) ถ้ามี ไม่งั้น CSV ทีละไฟล์ (ข้าม new_*)"""
+    if baseline_store.has_store(dirpath):
+        yield baseline_store.read_all(dirpath, columns); return
+    if not os.path.isdir(dirpath): return
+    for fn in sorted(os.listdir(dirpath)):
+        if not fn.lower().endswith(".csv") or fn.startswith("new_"): continue
+        try: df = pd.read_csv(os.path.join(dirpath, fn), dtype=str, keep_default_na=False, usecols=lambda c: columns is None or c in columns)
+        except Exception: continue
+        yield df
+
+def load_record_store(*dirpaths) -> Dict[str, Dict]:
+    """record ล่าสุดต่อเลขจดแจ้ง จาก CSV/store ผลลัพธ์เดิม (โฟลเดอร์หลังทับโฟลเดอร์ก่อน)"""
+    store: Dict[str, Dict] = {}
+    for d in dirpaths:
+        for df in baseline_frames(d):
+            for it in collect_items(df):
+                if it.get("notification_no"): store[it["notification_no"]] = it
+    return store
+
+def send_email_with_attachments(subject: str, body: str, attachments: list):
+    host = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+    port = int(os.environ.get("SMTP_PORT", "587"))
+    use_tls = os.environ.get("SMTP_USE_TLS", "1") == "1"
+    user = os.environ.get("SMTP_USER", "")
+    pwd = os.environ.get("SMTP_PASS", "")
+    to_list = [x.strip() for x in os.environ.get("SMTP_TO", "").split(",") if x.strip()]
+    if not (host and port and user and pwd and to_list):
+        log("SMTP env ไม่ครบ (HOST/PORT/USER/PASS/TO) – ข้ามการส่งอีเมล"); return
+
+    msg = EmailMessage(); msg["Subject"] = subject; msg["From"] = user; msg["To"] = ", ".join(to_list)
+    msg.set_content(body)
+    for path in attachments or []:
+        try:
+            with open(path, "rb") as f: data = f.read()
+            msg.add_attachment(data, maintype="text", subtype="csv", filename=os.path.basename(path))
+        except Exception as e:
+            log(f"แนบไฟล์ไม่สำเร็จ: {path} -> {e}")
+
+    try:
+        if use_tls and port == 587:
+            context = ssl.create_default_context()
+            with smtplib.SMTP(host, port, timeout=25) as server:
+                server.ehlo(); server.starttls(context=context); server.ehlo()
+                server.login(user, pwd); server.send_message(msg)
+        elif port == 465:
+            context = ssl.create_default_context()
+            with smtplib.SMTP_SSL(host, port, context=context, timeout=25) as server:
+                server.login(user, pwd); server.send_message(msg)
+        else:
+            with smtplib.SMTP(host, port, timeout=25) as server:
+                server.login(user, pwd); server.send_message(msg)
+        log("ส่งอีเมลสำเร็จ")
+    except Exception as e:
+        log(f"ส่งอีเมลไม่สำเร็จ: {e}")
+
+# ---------- Baseline seeding ----------
+def seed_seen_from_csvs(dirpath: str):
+    """สร้าง baseline จากไฟล์ CSV (หรือ store) ใน dirpath (อ่านได้ทั้งคอลัมน์ไทย/อังกฤษ) – อ่านเฉพาะคอลัมน์ผู้ประกอบการ/เลขจดแจ้ง"""
+    ops, items = set(), set()
+    for df in baseline_frames(dirpath, ["operator_name", "ชื่อผู้ประกอบการ", "notification_no", "เลขที่ใบรับจดแจ้ง"]):
+        if "operator_name" in df.columns:
+            ops |= set(str(x).strip() for x in df["operator_name"].dropna().astype(str))
+        elif "ชื่อผู้ประกอบการ" in df.columns:
+            ops |= set(str(x).strip() for x in df["ชื่อผู้ประกอบการ"].dropna().astype(str))
+        col_no = "notification_no" if "notification_no" in df.columns else ("เลขที่ใบรับจดแจ้ง" if "เลขที่ใบรับจดแจ้ง" in df.columns else None)
+        if col_no:
+            items |= set(str(x).strip() for x in df[col_no].dropna().astype(str))
+    ops.discard(""); items.discard("")  # ช่องว่าง (keep_default_na=False) ไม่ใช่ชื่อ/เลขจริง
+    return ops, items
+
+# ---------- Runner ----------
+def query_csv_path(kind: str, name: str, outdir="output_csv") -> str:
+    return os.path.join(outdir, QUERY_KINDS[kind]["csv"](name))
+
+def write_query_csv(kind: str, name: str, rows: List[Dict], outdir="output_csv"):
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df.reindex(columns=[c for c in COLS if c in df.columns]).rename(columns=TH_HEADERS)
+    os.makedirs(outdir, exist_ok=True)
+    out = query_csv_path(kind, name, outdir)
+    df.to_csv(out, index=False, encoding="utf-8-sig")
+    log(f"Saved: {out} ({len(df):,} แถว)")
+    return out
+
+def run_one(kind: str, name: str, headless=True, outdir="output_csv"):
+    drv = open_client(headless=headless)
+    try:
+        return write_query_csv(kind, name, scrape_query(drv, kind, name), outdir)
+    finally:
+        close_client(drv)
+
+# ---------- Scheduler (งานใหญ่ก่อน) ----------
+def plan_queries(queries: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """ตัด (ชนิด, ชื่อ) ซ้ำ คงลำดับเดิม – รายละเอียดที่ซ้ำข้าม query ถูกตัดด้วย RECORD_STORE ตอนดึงจริง"""
+    out, seen = [], set()
+    for q in queries:
+        if q not in seen: seen.add(q); out.append(q)
+    if len(out) < len(queries): log(f"[plan] ตัด query ซ้ำ {len(queries) - len(out)} รายการ")
+    return out
+
+def _norm_name(s: str) -> str:
+    """ชื่อเป็นคำคั่นด้วยช่องว่างเดียว: เครื่องหมาย/ช่องว่าง = ตัวคั่นคำ, ไม่สนตัวพิมพ์ ('DR.SOMCHAI  Acne' -> 'dr somchai acne')
+    สระ/วรรณยุกต์ไทย (หมวด M) นับเป็นส่วนของคำ"""
+    return " ".join("".join(c if unicodedata.category(c)[0] in "LMN" else " " for c in s or "").split()).casefold()
+
+def _has_words(name: str, part: str) -> bool:
+    """part (ที่ normalize แล้ว) อยู่ใน name เป็นคำเต็ม – 'anan' ไม่อยู่ใน 'banana boat', 'vita' ไม่อยู่ใน 'vitara'"""
+    return bool(part) and f" {part} " in f" {name} "
+
+def _site_match(name: str, query: str) -> bool:
+    """กติกาเดียวกับเว็บ: ชื่อการค้ามีสตริงที่ค้นอยู่ตรง ๆ (ไม่สนตัวพิมพ์ แต่เครื่องหมาย/ช่องว่างต้องตรง)"""
+    return bool(query) and query.casefold() in (name or "").casefold()
+
+def plan_brand_groups(queries: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], Dict[Tuple[str, str], List[Tuple[str, str]]]]:
+    """จัดกลุ่มยี่ห้อที่มีชื่อยี่ห้ออื่นอยู่ข้างใน (ผลของ 'BK' ครอบผลของ 'BK ACNE') – ค้นเฉพาะชื่อกว้างสุด
+    ต้องครอบตามกติกาของเว็บ (_site_match) และเป็นคำเต็ม (_has_words) ด้วย; ชื่อที่ต่างกันแค่เครื่องหมาย (DR SOMCHAI ACNE /
+    DR.SOMCHAI ACNE) ผลไม่ครอบกัน -> ค้นทั้งคู่
+    คืน (query ที่ต้องค้นจริง, {query กว้างสุด: [ยี่ห้อที่กรองจากผลของมัน]}) – ยี่ห้อหนึ่งผูกกับชื่อที่สั้นที่สุด (มาก่อน) ที่อยู่ในชื่อมัน"""
+    brands = [n for k, n in queries if k == "brand"]
+    norm = {n: _norm_name(n) for n in brands}
+    order = {n: i for i, n in enumerate(brands)}
+    derived: Dict[Tuple[str, str], List[Tuple[str, str]]] = defaultdict(list)
+    for n in brands:
+        inside = [o for o in brands if o != n and _site_match(n, o) and _has_words(norm[n], norm[o])
+                  and (o.casefold() != n.casefold() or order[o] < order[n])]
+        if inside:  # ตัวที่สั้นสุด (เท่ากันเอาตัวที่มาก่อน) ไม่มีชื่ออื่นอยู่ข้างในแล้ว = ชื่อกว้างสุด
+            derived[("brand", min(inside, key=lambda o: (len(o), order[o])))].append(("brand", n))
+    skip = {q for qs in derived.values() for q in qs}
+    if derived:
+        log(f"[plan] ยี่ห้อซ้อนกัน {len(derived)} กลุ่ม -> ไม่ต้องค้น {len(skip)} ยี่ห้อ (ลดการค้นหา {len(skip) * len(search_years())} ครั้ง): "
+            + "; ".join(f"{r[1]} ⊃ {', '.join(n for _, n in qs)}" for r, qs in derived.items()))
+    return [q for q in queries if q not in skip], dict(derived)
+
+def derive_rows(rows: List[Dict], kind: str, name: str) -> List[Dict]:
+    """แถวของยี่ห้อแคบจากผลของชื่อกว้างสุด: กรองด้วยกติกาเดียวกับเว็บ (_site_match) = ผลเหมือนค้นชื่อนี้เอง แล้วเปลี่ยนคอลัมน์ query"""
+    qcol = QUERY_KINDS[kind]["col"]
+    return [dict(r, **{qcol: name}) for r in rows if _site_match(r.get("trade_name", ""), name)]
+
+def write_derived(derived: Dict[Tuple[str, str], List[Tuple[str, str]]], kind: str, name: str, rows: List[Dict], outdir: str):
+    """เขียน CSV ของยี่ห้อแคบทุกตัวในกลุ่มของ (kind, name) – คืนจำนวนแถวที่ได้จากการกรองในเครื่อง"""
+    n = 0
+    for k, narrow in derived.get((kind, name), []):
+        sub = derive_rows(rows, k, narrow); n += len(sub)
+        write_query_csv(k, narrow, sub, outdir)
+    return n
+
+def _csv_rows(path: str) -> int:
+    with open(path, "rb") as f: return max(sum(1 for _ in f) - 1, 0)
+
+def estimate_costs(queries: List[Tuple[str, str]], *dirpaths) -> Dict[Tuple[str, str], int]:
+    """ต้นทุนโดยประมาณ = จำนวนแถวจาก CSV รอบก่อน (โฟลเดอร์หลังทับโฟลเดอร์ก่อน); ไม่เคยรัน = ค่ามัธยฐาน"""
+    costs: Dict[Tuple[str, str], int] = {}
+    for q in queries:
+        for d in dirpaths:
+            try: costs[q] = _csv_rows(query_csv_path(*q, outdir=d)) + 1  # +1 = ค่าค้นหา/หน้าแรก แม้ไม่มีแถว
+            except OSError: pass
+    known = sorted(costs.values())
+    median = known[len(known) // 2] if known else 1
+    return {q: costs.get(q, median) for q in queries}
+
+def plan_by_cost(queries: List[Tuple[str, str]], costs: Dict[Tuple[str, str], int]) -> List[Tuple[str, str]]:
+    """LPT (longest-processing-time first): ส่งงานใหญ่ก่อน worker ที่ว่างจะหยิบงานถัดไปเอง (chunksize=1)"""
+    order = sorted(queries, key=lambda q: -costs.get(q, 0))
+    log("[plan] งานใหญ่สุด: " + ", ".join(f"{n}≈{costs[(k, n)]:,}" for k, n in order[:5]))
+    return order
+
+def plan_shards(queries: List[Tuple[str, str]], costs: Dict[Tuple[str, str], int]) -> List[Tuple[str, str, Optional[str], int, Optional[int]]]:
+    """แตกงานเป็น (ชนิด, ชื่อ, ปี, หน้าแรก, หน้าสุดท้าย): งานเล็ก = ทั้งชื่อ (ปี None); งานใหญ่ = ช่วงละ SHARD_PAGES หน้า
+    ช่วงสุดท้ายเปิดท้ายไว้ (None) เผื่อรอบนี้มีหน้ามากกว่าที่ประมาณ"""
+    tasks, task_cost = [], {}
+    for kind, name in plan_by_cost(queries, costs):
+        pages = -(-costs[(kind, name)] // GRID_PAGE_SIZE)
+        if pages <= SHARD_PAGES or NEWEST_FIRST:  # เรียงใหม่สุดก่อน: ส่วนใหญ่จบในไม่กี่หน้าแรก ไม่ต้องแบ่งช่วง
+            t = (kind, name, None, 1, None); tasks.append(t); task_cost[t] = costs[(kind, name)]; continue
+        starts = list(range(1, pages + 1, SHARD_PAGES))
+        for yy2 in search_years():
+            for n, first in enumerate(starts):
+                t = (kind, name, yy2, first, None if n == len(starts) - 1 else first + SHARD_PAGES - 1)
+                tasks.append(t); task_cost[t] = SHARD_PAGES * GRID_PAGE_SIZE
+        log(f"[plan] {name}: ≈{pages} หน้า -> แบ่ง {len(starts) * len(search_years())} ช่วง")
+    return sorted(tasks, key=lambda t: -task_cost[t])
+
+def merge_shards(parts: List[Tuple[str, int, List[Dict]]]) -> List[Dict]:
+    """รวมผลทุกช่วงตามลำดับ (ปี, หน้า) แล้วตัดซ้ำด้วย notification_no"""
+    out, seen = [], set()
+    for _, _, rows in sorted(parts, key=lambda p: (p[0], p[1])):
+        for r in rows:
+            no = r.get("notification_no", "")
+            if no and no in seen: continue
+            seen.add(no); out.append(r)
+    return out
+
+# ---------- Worker pool (Chrome ตัวเดียวต่อ process) ----------
+_WORKER = {"drv": None, "used": 0, "headless": True, "driver_path": None}
+
+def _close_worker_client():
+    if _WORKER["drv"] is not None:
+        try: close_client(_WORKER["drv"])
+        except Exception: pass
+    _WORKER["drv"] = None; _WORKER["used"] = 0
+
+def _on_worker_term(signum, frame):
+    """pool.terminate() (crawl ล้มกลางทาง) ส่ง SIGTERM – Finalize ไม่ทำงาน ต้องปิด Chrome เองก่อนออก ไม่ให้ค้างบน runner"""
+    _close_worker_client()
+    os._exit(0)
+
+def _init_worker(headless, driver_path, record_store, journal_path="", journal=None, cache_path="", fp_path="", seen_path=""):
+    global RECORD_STORE, JOURNAL_PATH, JOURNAL, FP_PATH, SEEN_PATH
+    RECORD_STORE, JOURNAL_PATH, FP_PATH, SEEN_PATH = DetailStore(record_store, cache_path), journal_path, fp_path, seen_path
+    if journal is not None: JOURNAL = journal
+    _WORKER.update(headless=headless, driver_path=driver_path)
+    _WORKER["drv"] = open_client(headless=headless, driver_path=driver_path)
+    mp.util.Finalize(None, _close_worker_client, exitpriority=10)  # ปิดปกติ (pool.close/join)
+    signal.signal(signal.SIGTERM, _on_worker_term)
+
+def run_task_pooled(task):
+    """งานของ worker: ใช้ client ที่เปิดค้างไว้ – crash = เปิดใหม่แล้วลองอีกครั้ง, ครบ DRIVER_RECYCLE_EVERY = เปิดใหม่
+    ล้มทั้งสองครั้ง -> rows = None (crawl ไม่เขียน CSV / ไม่บันทึก done ให้ --resume ทำใหม่)"""
+    kind, name, yy2, first, last = task
+    rows = None
+    for attempt in (1, 2):
+        if _WORKER["drv"] is None:
+            _WORKER["drv"] = open_client(headless=_WORKER["headless"], driver_path=_WORKER["driver_path"])
+        try:
+            drv = _WORKER["drv"]
+            rows = scrape_query(drv, kind, name) if yy2 is None else scrape_query_pages(drv, kind, name, yy2, first, last); break
+        except Exception as e:
+            log(f"[worker {os.getpid()}] {task} ล้มเหลว (attempt {attempt}): {str(e).splitlines()[0] if str(e) else type(e).__name__} -> เปิด client ใหม่")
+            _close_worker_client()
+    _WORKER["used"] += 1
+    if _WORKER["used"] >= DRIVER_RECYCLE_EVERY: _close_worker_client()
+    return task, rows, FP_SKIPS.pop((kind, name), 0)
+
+# ---------- Crawl (brand + operator ในรอบเดียว) ----------
+def crawl(queries: List[Tuple[str, str]], headless=True, outdir="output_csv", workers=1, resume=False) -> List[str]:
+    """ดึงทุก (ชนิด, ชื่อ) แล้วเขียน CSV ต่อ query – คืน path ของ CSV ทั้งหมด
+    เลขจดแจ้งที่ query หนึ่งดึงรายละเอียดแล้ว query อื่นในรอบเดียวกันใช้ซ้ำจาก RECORD_STORE (WORKERS > 1 = dict กลางผ่าน Manager)
+    และรอบถัดไปใช้ซ้ำจาก cache SQLite จนกว่าจะหมด TTL (DETAIL_CACHE)"""
+    global RECORD_STORE, JOURNAL_PATH, JOURNAL, FP_PATH, SEEN_PATH
+    os.makedirs(outdir, exist_ok=True)
+    queries = plan_queries(queries)
+    searched, derived = plan_brand_groups(queries) if COLLAPSE_BRANDS else (queries, {})
+    n_derived = 0  # แถวของยี่ห้อแคบที่ได้จากการกรองในเครื่อง (ไม่ต้องไล่หน้า/เปิดรายละเอียดซ้ำ)
+    JOURNAL_PATH = os.path.join(outdir, "_journal.jsonl")
+    if resume:
+        JOURNAL = load_journal(JOURNAL_PATH)
+        log(f"[resume] เสร็จแล้ว {len(JOURNAL['done']):,} รายการ | หน้าที่บันทึกไว้ {sum(len(p) for p in JOURNAL['pages'].values()):,} หน้า")
+    else:
+        open(JOURNAL_PATH, "w", encoding="utf-8").close()
+
+    if INCREMENTAL:
+        base_dir = os.environ.get("FDA_BASELINE_DIR", "baseline")
+        seen_idx = open_seen(os.path.join(outdir, "_items_seen.json"))
+        store = load_record_store(base_dir, outdir)
+        if len(seen_idx): n_seen, unseen = len(seen_idx), seen_idx.missing(store)
+        else: seed = seed_seen_from_csvs(base_dir)[1]; n_seen, unseen = len(seed), set(store) - seed
+        seen_idx.close()
+        RECORD_STORE = {no: rec for no, rec in store.items() if no not in unseen}
+        log(f"[incremental] seen={n_seen:,} | record ในเครื่อง {len(RECORD_STORE):,} รายการ (ไม่ต้องเปิดหน้ารายละเอียด)")
+    else:
+        RECORD_STORE = {}
+    cache_path = os.path.join(outdir, "_detail_cache.sqlite") if DETAIL_CACHE else ""
+    if cache_path: log(f"[cache] เปิด cache รายละเอียด (TTL สูงสุด {CACHE_TTL_DAYS:g} วัน) – record จาก cache อาจไม่เห็นสถานะที่เพิ่งเปลี่ยน")
+    FP_PATH = os.path.join(outdir, "_grid_fp.sqlite") if FINGERPRINT else ""
+    if FP_PATH: log(f"[fingerprint] เปิดข้ามคำค้นที่หน้าแรกเท่ารอบก่อน (อายุสูงสุด {FP_MAX_AGE_DAYS:g} วัน) – หน้าถัดไปที่เปลี่ยนจะไม่เห็น")
+    FP_SKIPS.clear()
+    SEEN_PATH = os.path.join(outdir, "_items_seen.json") if NEWEST_FIRST else ""
+    if SEEN_PATH:  # seed ที่ process หลักครั้งเดียวก่อนแตก worker – รอบแรกไม่มีดัชนีก็หยุดที่เลขใน baseline ได้
+        for idx in open_seen_indexes(outdir): idx.close()
+    _SEEN["pid"] = None  # report() ของรอบก่อนเพิ่มเลขใหม่ลงดัชนีแล้ว – เปิดใหม่
+
+    outs = [query_csv_path(k, n, outdir) for k, n in queries]
+    if workers <= 1:
+        RECORD_STORE = DetailStore(RECORD_STORE, cache_path)
+        drv = open_client(headless=headless)
+        try:
+            for kind, name in searched:
+                out = query_csv_path(kind, name, outdir)
+                if (kind, name) in JOURNAL["done"] and os.path.exists(out):
+                    log(f"[resume] ข้าม {name} (เสร็จแล้วในรอบก่อน)"); continue
+                rows = scrape_query(drv, kind, name)
+                write_query_csv(kind, name, rows, outdir); n_derived += write_derived(derived, kind, name, rows, outdir); log("")
+                journal_write({"ev": "done", "k": kind, "q": name, "out": out})
+        finally:
+            close_client(drv)
+        if cache_path: log(f"[cache] ใช้รายละเอียดจาก cache {RECORD_STORE.hits:,} รายการ (ไม่ต้อง postback)")
+        log_plan_summary(derived, n_derived); log_fp_summary(len(searched))
+        return outs
+
+    driver_path = ChromeDriverManager().install() if ENGINE != "http" else None  # resolve ครั้งเดียวที่ parent
+    costs = estimate_costs(searched, os.environ.get("FDA_BASELINE_DIR", "baseline"), outdir)
+    todo = [q for q in searched if q not in JOURNAL["done"]]
+    if len(todo) < len(searched): log(f"[resume] ข้าม {len(searched) - len(todo)} รายการที่เสร็จแล้วในรอบก่อน")
+    tasks = plan_shards(todo, costs)
+    pending, parts, failed = Counter(t[:2] for t in tasks), defaultdict(list), set()
+    with mp.Manager() as mgr:
+        store = mgr.dict(RECORD_STORE)
+        with mp.Pool(processes=max(1, min(workers, len(tasks), mp.cpu_count())), initializer=_init_worker,
+                     initargs=(headless, driver_path, store, JOURNAL_PATH, JOURNAL, cache_path, FP_PATH, SEEN_PATH)) as pool:
+            for (kind, name, yy2, first, _), rows, skips in pool.imap_unordered(run_task_pooled, tasks, chunksize=1):
+                q = (kind, name)
+                if skips: FP_SKIPS[q] += skips
+                if rows is None: failed.add(q)
+                parts[q].append((yy2 or "", first, rows or [])); pending[q] -= 1
+                if pending[q] == 0:
+                    rows = merge_shards(parts.pop(q))
+                    if q in failed:
+                        log(f"[crawl] {name} ดึงไม่สำเร็จ -> ไม่เขียน CSV (ใช้ --resume ทำต่อ)"); continue
+                    out = write_query_csv(kind, name, rows, outdir); n_derived += write_derived(derived, kind, name, rows, outdir)
+                    journal_write({"ev": "done", "k": kind, "q": name, "out": out})
+            pool.close(); pool.join()
+    log_plan_summary(derived, n_derived); log_fp_summary(len(searched))
+    if failed: raise RuntimeError(f"ดึงไม่สำเร็จ {len(failed)} รายการ: {', '.join(n for _, n in sorted(failed))}")
+    return outs
+
+def log_plan_summary(derived: Dict[Tuple[str, str], List[Tuple[str, str]]], n_rows: int):
+    if not derived: return
+    n = sum(len(qs) for qs in derived.values())
+    log(f"[plan] ยี่ห้อซ้อนกัน: ลดการค้นหา {n * len(search_years())} ครั้ง ({n} ยี่ห้อ) | แยกแถวจากผลของชื่อกว้างสุด {n_rows:,} แถว")
+
+def log_fp_summary(n_queries: int):
+    if not FP_PATH: return
+    log(f"[fingerprint] ผลค้นหาไม่เปลี่ยน ข้ามการไล่หน้า/รายละเอียด {len(FP_SKIPS):,}/{n_queries:,} query ({sum(FP_SKIPS.values()):,} การค้นหา)")
+
+# ---------- Diff & report ----------
+def open_seen_indexes(outdir: str):
+    """(ดัชนีผู้ประกอบการ, ดัชนีเลขจดแจ้ง) ที่เคยเห็น – ยังว่างทั้งคู่ = seed จาก FDA_BASELINE_DIR ก่อน"""
+    # ดัชนี SQLite ข้าง ๆ ไฟล์ JSON เดิม (รอบแรกย้ายข้อมูลจาก JSON ให้เอง)
+    seen_ops = open_seen(os.path.join(outdir, "_operators_seen.json"))
+    seen_item_nos = open_seen(os.path.join(outdir, "_items_seen.json"))
+
+    # ถ้ายังไม่มี baseline ให้ seed จาก baseline/ (ตั้งค่าได้ผ่าน FDA_BASELINE_DIR)
+    if not len(seen_ops) and not len(seen_item_nos):
+        base_dir = os.environ.get("FDA_BASELINE_DIR", "baseline")
+        log(f"No seen baseline found → seeding from '{base_dir}' ...")
+        seed_ops, seed_items = seed_seen_from_csvs(base_dir)
+        if seed_ops or seed_items:
+            seen_ops.add(seed_ops)
+            seen_item_nos.add(seed_items)
+            log(f"Seeded baseline: ops={len(seed_ops):,}, items={len(seed_items):,}")
+        else:
+            log(f"Baseline folder '{base_dir}' not found or empty.")
+    return seen_ops, seen_item_nos
+
+def report(outdir: str, csv_paths: List[str]):
+    """เทียบผลรอบนี้ (CSV ทุก query) กับ seen set -> new_changes_<วันที่>.csv + อีเมลสรุป"""
+    all_ops_current = set()
+    all_items_current = []
+    for p in csv_paths:
+        try: df = pd.read_csv(p, dtype=str, keep_default_na=False)
+        except Exception: continue
+        all_ops_current |= collect_operator_names(df)
+        all_items_current += collect_items(df)
+
+    seen_ops, seen_item_nos = open_seen_indexes(outdir)
+
+    by_operator_all = {}
+    for it in all_items_current:
+        by_operator_all.setdefault(it["operator_name"], []).append(it)
+
+    current_item_nos = {it["notification_no"] for it in all_items_current if it.get("notification_no")}
+    new_ops = sorted(seen_ops.missing(all_ops_current))
+    new_item_nos = seen_item_nos.missing(current_item_nos)
+
+    new_ops_rows = []
+    for op in new_ops:
+        for it in by_operator_all.get(op, []):
+            new_ops_rows.append({"สถานะ":"ผู้ประกอบการใหม่", **it})
+
+    existing_ops_new_items_rows = []
+    for op, items in by_operator_all.items():
+        if op in new_ops: continue
+        for it in items:
+            if it["notification_no"] in new_item_nos:
+                existing_ops_new_items_rows.append({"สถานะ":"สินค้าใหม่ (ผู้ประกอบการเดิม)", **it})
+
+    report_rows = new_ops_rows + existing_ops_new_items_rows
+
+    if report_rows:
+        today = datetime.now().strftime("%Y-%m-%d")
+        new_csv = os.path.join(outdir, f"new_changes_{today}.csv")
+        df_report = pd.DataFrame(report_rows)
+        if "notification_year_be_last2" not in df_report.columns and "notification_no" in df_report.columns:
+            df_report["notification_year_be_last2"] = df_report["notification_no"].map(year_from_no)
+        df_report = align_new_changes_strict(df_report, keep_status=True)
+        df_report.to_csv(new_csv, index=False, encoding="utf-8-sig")
+
+        seen_ops.add(new_ops)  # append เฉพาะค่าใหม่
+        seen_item_nos.add(new_item_nos)
+
+        # Email สรุป
+        max_show = 20
+        lines = []
+        if new_ops:
+            lines.append(f"ผู้ประกอบการใหม่: {len(new_ops)} ราย")
+            for op in new_ops[:max_show]:
+                ex = by_operator_all.get(op, [])[:3]
+                samples = ", ".join([x.get("trade_name") or x.get("cosmetic_name") or x["notification_no"] for x in ex])
+                lines.append(f"  - {op} (ตัวอย่างสินค้า: {samples})")
+            if len(new_ops) > max_show:
+                lines.append(f"  ... และอื่น ๆ อีก {len(new_ops)-max_show} ราย")
+        if existing_ops_new_items_rows:
+            m = defaultdict(list)
+            for r in existing_ops_new_items_rows: m[r["operator_name"]].append(r)
+            lines.append(f"ผู้ประกอบการเดิมที่มีสินค้าใหม่: {len(m)} ราย")
+            for op in list(m.keys())[:max_show]:
+                ex = m[op][:3]
+                samples = ", ".join([x.get("trade_name") or x.get("cosmetic_name") or x["notification_no"] for x in ex])
+                lines.append(f"  - {op} (+{len(m[op])} รายการใหม่, ตัวอย่าง: {samples})")
+            if len(m) > max_show:
+                lines.append(f"  ... และอื่น ๆ อีก {len(m)-max_show} ราย")
+
+        subject = "[FDA] สรุปความเปลี่ยนแปลง: ผู้ประกอบการใหม่ / สินค้าใหม่"
+        body = f"""พบความเปลี่ยนแปลงจากรอบรันล่าสุด
+{chr(10).join(lines)}
+
+แนบไฟล์: {os.path.basename(new_csv)}
+โฟลเดอร์เอาต์พุต: {os.path.abspath(outdir)}
+"""
+        send_email_with_attachments(subject, body, [new_csv])
+        log(f"สร้าง {new_csv} และส่งอีเมลสรุปแล้ว")
+    else:
+        subject = "[FDA] รอบนี้ไม่มีผู้ประกอบการหรือสินค้าใหม่"
+        body = f"""สรุปผลรอบรันล่าสุด:
+- ไม่พบผู้ประกอบการใหม่
+- ไม่พบสินค้าใหม่
+
+โฟลเดอร์เอาต์พุต: {os.path.abspath(outdir)}
+"""
+        send_email_with_attachments(subject, body, [])
+        log("ไม่มีผู้ประกอบการใหม่หรือสินค้าใหม่ → ส่งอีเมลแจ้งแล้ว")
+
+def run(queries: List[Tuple[str, str]], headless=True, outdir="output_csv", workers=1, resume=False):
+    """crawl ทุก query แล้วทำรายงานครั้งเดียว – entry point ของ FDABrands.py / FDAOPERATORS.py / FDAALL.py"""
+    report(outdir, crawl(queries, headless=headless, outdir=outdir, workers=workers, resume=resume))
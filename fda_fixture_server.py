@@ -0,0 +1,48 @@
+# fda_fixture_server.py – เซิร์ฟเวอร์ local สำหรับ replay fixture ที่บันทึกไว้ด้วย FDA_RECORD_DIR
+# -*- coding: utf-8 -*-
+# บันทึก:  FDA_ENGINE=http FDA_RECORD_DIR=fixtures python FDABrands.py
+# replay:  python fda_fixture_server.py fixtures --port 8765
+#          FDA_ENGINE=http FDA_URL=http://127.0.0.1:8765/FDA_SEARCH_CENTER/PRODUCT/FRM_SEARCH_CMT.aspx python FDABrands.py
+import os, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+from fda_http import fixture_key
+
+def make_handler(fixture_dir: str):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def _serve(self, method: str, data=None):
+            key = fixture_key(method, self.path, data)
+            p = os.path.join(fixture_dir, f"{key}.html")
+            if not os.path.isfile(p):
+                self.send_error(404, f"no fixture {key}"); return
+            with open(p, "rb") as f: body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def do_GET(self): self._serve("GET")
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            self._serve("POST", dict(parse_qsl(raw, keep_blank_values=True)))
+
+        def log_message(self, fmt, *args): pass
+    return FixtureHandler
+
+def serve(fixture_dir: str, port: int = 0, background: bool = False) -> ThreadingHTTPServer:
+    """เปิดเซิร์ฟเวอร์ (port=0 = สุ่มพอร์ตว่าง) – background=True ใช้ในสคริปต์ทดสอบแบบ offline"""
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fixture_dir))
+    if background: threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Replay recorded FDA search/detail responses offline.")
+    ap.add_argument("fixture_dir")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    srv = serve(args.fixture_dir, args.port)
+    print(f"Serving {args.fixture_dir} on http://127.0.0.1:{srv.server_address[1]}/", flush=True)
+    try: srv.serve_forever()
+    except KeyboardInterrupt: pass
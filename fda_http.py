@@ -0,0 +1,409 @@
+# fda_http.py – HTTP engine: ยิง postback ของ ASP.NET ตรง ๆ ด้วย requests (ไม่ต้องเปิด Chrome)
+# -*- coding: utf-8 -*-
+import os, re, json, hashlib, asyncio
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+
+# ===== URL (ชี้ไปที่ fixture server ได้ด้วย FDA_URL) =====
+URL = os.environ.get("FDA_URL", "https://pertento.fda.moph.go.th/FDA_SEARCH_CENTER/PRODUCT/FRM_SEARCH_CMT.aspx")
+
+# ===== คอนฟิก =====
+RECORD_DIR = os.environ.get("FDA_RECORD_DIR", "")  # ตั้งไว้ = บันทึกทุก response เป็น fixture สำหรับ replay
+POOL_SIZE  = 8
+DETAIL_CONCURRENCY = int(os.environ.get("FDA_DETAIL_CONCURRENCY", "4"))  # จำนวน detail request ที่ยิงพร้อมกันต่อ host
+TIMEOUT    = 60
+PAGE_SIZE  = int(os.environ.get("FDA_PAGE_SIZE", "50"))  # แถวต่อหน้าที่ตั้งให้ RadGrid หลังค้นหา (0 = ใช้ค่าเดิมของเว็บ)
+WARM_FORM  = os.environ.get("FDA_WARM_FORM", "1") == "1"  # ค้นหาถัดไปส่งจากฟอร์มบนหน้าผลลัพธ์เดิม ไม่ GET หน้าค้นหาใหม่ทุกครั้ง
+NEWEST_FIRST = os.environ.get("FDA_NEWEST_FIRST", "0") == "1"  # เรียงผลใหม่สุดก่อน แล้วหยุดไล่หน้าเมื่อทั้งหน้าเป็นเลขที่เคยเห็นแล้ว (รอบรายวัน)
+SORT_FIELD = os.environ.get("FDA_SORT_FIELD", "")  # sort expression ของคอลัมน์ที่ใช้เรียง ('' = หาจากหัวตารางตาม SORT_HEADERS)
+SORT_HEADERS = ["วันที่อนุญาต", "เลขที่ใบรับจดแจ้ง"]  # หัวคอลัมน์ที่ใช้เรียงได้ เรียงตามลำดับที่อยากได้
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
+
+ROWS_XP = "//table[contains(@class,'rgMasterTable')]/tbody/tr[count(td)>=2]"
+NEXT_XP = ("//input[contains(@class,'rgPageNext') and not(@disabled)]"
+           " | //a[contains(@class,'rgPageNext') and not(contains(@class,'rgDisabled'))]")
+BRAND_INPUT_IDS = ["ContentPlaceHolder1_txt_trade","ContentPlaceHolder1_txt_tradename","ContentPlaceHolder1_txt_brand"]
+BRAND_INPUT_XPS = ["//label[contains(.,'ค้นจากชื่อการค้า')]/following::input[1]",
+                   "//span[contains(.,'ค้นจากชื่อการค้า')]/following::input[1]",
+                   "//div[contains(.,'ค้นจากชื่อการค้า')]/following::input[1]"]
+TEXT_INPUT_XP = "//input[@type='text' or not(@type)]"  # สำรองสุดท้าย: ช่องข้อความช่องที่ 2 ของฟอร์ม
+DETAIL_IDS = {
+    "notification_status": "ContentPlaceHolder1_lb_status",
+    "notification_no": "ContentPlaceHolder1_lb_no_regnos",
+    "notification_type": "ContentPlaceHolder1_lb_type",
+    "trade_name": "ContentPlaceHolder1_lb_trade_Tpop",
+    "cosmetic_name": "ContentPlaceHolder1_lb_cosnm_Tpop",
+    "approve_date": "ContentPlaceHolder1_lb_appdate",
+    "expire_date": "ContentPlaceHolder1_lb_expdate",
+    "operator_name": "ContentPlaceHolder1_lb_usernm_pop",
+    "foreign_mfr": "ContentPlaceHolder1_lb_fac_pop",
+    "contract_manufacturer": "ContentPlaceHolder1_lb_NAME_EMPLOYER",
+    "reference_for": "ContentPlaceHolder1_lb_NO_pop",
+}
+POSTBACK_RE = re.compile(r"__doPostBack\('([^']+)','([^']*)'\)")
+WINDOW_OPEN_RE = re.compile(r"window\.open\(\s*['\"]([^'\"]+)['\"]")
+NOTIF_RE = re.compile(r"\b(\d{1,2})\D+(\d{1,2})\D+(\d{2,})\b")
+GRID_UID_RE = re.compile(r"Telerik\.Web\.UI\.RadGrid\s*,\s*\{.*?\"UniqueID\"\s*:\s*\"([^\"]+)\"", re.S)
+GRID_SORT_RE = re.compile(r"Grid\.Sort\(\s*\$find\([^)]*\)\s*,\s*'([^']+)'")  # onclick ของลิงก์หัวคอลัมน์ที่เรียงได้
+HEADER_LINK_XP = "//table[contains(@class,'rgMasterTable')]/thead//th//a"
+SORTED_DESC_XP = "//table[contains(@class,'rgMasterTable')]/thead//*[contains(@class,'rgSortDesc')]"
+
+class DetailOpenError(Exception): ...
+class ResultCapped(Exception):
+    """ค้นรวมทุกปี (ช่องปีว่าง) แล้วจำนวนผลชนเพดานของเว็บ – ต้องแยกค้นทีละปี; args[0] = จำนวนผล"""
+def log(msg): print(msg, flush=True)
+
+def notif_from_row_text(text: str) -> str:
+    m = NOTIF_RE.search(text or "")
+    return f"{m.group(1)}-{m.group(2)}-{m.group(3)}" if m else ""
+
+def year_from_no(no: str) -> str:
+    toks = [t for t in re.split(r"\D+", (no or "").strip()) if t]
+    if len(toks) >= 3: return toks[2][:2] if len(toks[2]) >= 2 else ""
+    return ""
+
+def year_ok(no: str, yy2: str, allow_yy) -> bool:
+    """yy2 = "" คือการค้นรวมทุกปี -> รับทุกปีใน allow_yy"""
+    y = year_from_no(no)
+    return y == yy2 if yy2 else y in allow_yy
+
+# ---------- Session / transport ----------
+def new_session(pool_size: int = max(POOL_SIZE, DETAIL_CONCURRENCY)) -> requests.Session:
+    """Session เดียวต่อ worker: connection pool + retry (POST ของหน้านี้ยิงซ้ำได้ปลอดภัย)"""
+    sess = requests.Session()
+    retry = Retry(total=4, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    sess.mount("http://", adapter); sess.mount("https://", adapter)
+    sess.headers.update({"User-Agent": UA, "Accept-Language": "th-TH,th;q=0.9"})
+    return sess
+
+def fixture_key(method: str, url: str, data: Optional[Dict[str, str]] = None) -> str:
+    """คีย์ของ fixture: method + path + ฟิลด์ที่มีความหมาย (ตัด __VIEWSTATE/ClientState ที่เปลี่ยนทุกครั้งออก)"""
+    parts = urlsplit(url)
+    sig = [method.upper(), parts.path + (f"?{parts.query}" if parts.query else "")]
+    for k, v in sorted((data or {}).items()):
+        if k.startswith("__") and k not in ("__EVENTTARGET", "__EVENTARGUMENT"): continue
+        if k.endswith("ClientState") or v in ("", None): continue
+        sig.append(f"{k}={v}")
+    return hashlib.sha1("\n".join(sig).encode("utf-8")).hexdigest()[:20]
+
+def _record(method: str, url: str, data, resp: requests.Response):
+    try:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        key = fixture_key(method, url, data)
+        with open(os.path.join(RECORD_DIR, f"{key}.html"), "w", encoding="utf-8") as f: f.write(resp.text)
+        meta = {"method": method, "url": url, "status": resp.status_code,
+                "fields": {k: v for k, v in (data or {}).items() if not k.startswith("__VIEWSTATE")}}
+        with open(os.path.join(RECORD_DIR, f"{key}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        log(f"[record] บันทึก fixture ไม่สำเร็จ: {e}")
+
+def _request(sess: requests.Session, method: str, url: str, data: Optional[Dict[str, str]] = None):
+    resp = sess.request(method, url, data=data, timeout=TIMEOUT)
+    resp.raise_for_status()
+    if RECORD_DIR: _record(method, url, data, resp)
+    return lxml.html.document_fromstring(resp.text, base_url=resp.url)
+
+def http_get(sess, url: str = URL):
+    return _request(sess, "GET", url)
+
+def form_data(doc) -> Dict[str, str]:
+    """ค่าทุกช่องของฟอร์ม ASP.NET (รวม __VIEWSTATE/__EVENTVALIDATION) เหมือนที่เบราว์เซอร์จะส่ง"""
+    if not doc.forms: return {}
+    return {k: v for k, v in doc.forms[0].form_values()}
+
+def grid_state(doc) -> Tuple[str, Dict[str, str]]:
+    """(action url, ค่าฟอร์ม) ของหน้า – ใช้ยิง postback ซ้ำจาก state เดิมได้หลายครั้ง"""
+    form = doc.forms[0]
+    return urljoin(doc.base_url, form.get("action") or doc.base_url), form_data(doc)
+
+def driver_form_state(drv) -> Tuple[str, Dict[str, str]]:
+    """state เดียวกันแต่อ่านจากหน้าใน Selenium (FormData = ค่าปัจจุบันหลัง AJAX ไม่ใช่ค่าใน page_source)"""
+    action, data = drv.execute_script("""
+        var f = document.forms[0], o = {};
+        new FormData(f).forEach(function(v, k){ if (typeof v === 'string') o[k] = v; });
+        return [f.action || location.href, o];
+    """)
+    return action, data
+
+def session_from_driver(drv, sess: Optional[requests.Session] = None) -> requests.Session:
+    """ยืม cookie (ASP.NET_SessionId ฯลฯ) และ user-agent ของ Chrome มาใช้กับ requests"""
+    sess = sess or new_session()
+    for c in drv.get_cookies():
+        sess.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+    try: sess.headers["User-Agent"] = drv.execute_script("return navigator.userAgent") or UA
+    except Exception: pass
+    return sess
+
+def post_state(sess, state: Tuple[str, Dict[str, str]], extra: Dict[str, str]):
+    url, base = state
+    data = dict(base)
+    data.setdefault("__EVENTTARGET", ""); data.setdefault("__EVENTARGUMENT", "")
+    data.update(extra)
+    return _request(sess, "POST", url, data)
+
+def http_post(sess, doc, extra: Dict[str, str]):
+    return post_state(sess, grid_state(doc), extra)
+
+def _click_data(el) -> Dict[str, str]:
+    """ข้อมูลที่เบราว์เซอร์ส่งเมื่อคลิก element นี้ (LinkButton = __doPostBack, ปุ่ม submit = name/value)"""
+    if el.tag == "a":
+        m = POSTBACK_RE.search(el.get("href") or "")
+        return {"__EVENTTARGET": m.group(1), "__EVENTARGUMENT": m.group(2)} if m else {}
+    name = el.get("name") or ""
+    if not name: return {}
+    if (el.get("type") or "").lower() == "image": return {f"{name}.x": "1", f"{name}.y": "1"}
+    return {name: el.get("value") or ""}
+
+# ---------- Parsing ----------
+def _text(el) -> str:
+    for br in el.iter("br"): br.tail = "\n" + (br.tail or "")
+    return re.sub(r"\s+", " ", el.text_content() or "").strip()
+
+def _by_id(doc, _id: str):
+    els = doc.xpath(f"//*[@id='{_id}']")
+    return els[0] if els else None
+
+def _brand_input(doc):
+    for i in BRAND_INPUT_IDS:
+        el = _by_id(doc, i)
+        if el is not None: return el
+    for xp in BRAND_INPUT_XPS:
+        els = doc.xpath(xp)
+        if els: return els[0]
+    txts = doc.xpath(TEXT_INPUT_XP)
+    return txts[1] if len(txts) >= 2 else None
+
+def grid_rows(doc) -> List[Dict[str, str]]:
+    """แถวของ RadGrid: ข้อความ, เลขจดแจ้ง และ target/argument ของลิงก์ 'ดูข้อมูล'"""
+    out = []
+    for tr in doc.xpath(ROWS_XP):
+        txt = re.sub(r"\s+", " ", " ".join(td.text_content() for td in tr.xpath("./td"))).strip()
+        links = tr.xpath(".//a[contains(@href,'__doPostBack') and contains(.,'ดูข้อมูล')]")
+        m = POSTBACK_RE.search(links[0].get("href") or "") if links else None
+        out.append({"text": txt, "notification_no": notif_from_row_text(txt),
+                    "target": m.group(1) if m else "", "argument": m.group(2) if m else ""})
+    return out
+
+def page_val(doc) -> str:
+    els = doc.xpath("//input[contains(@class,'rgCurrentPage')]")
+    return (els[0].get("value") or "").strip() if els else ""
+
+def detail_record(doc) -> Dict[str, str]:
+    rec = {}
+    for col, _id in DETAIL_IDS.items():
+        el = _by_id(doc, _id)
+        rec[col] = _text(el) if el is not None else ""
+    rec["skus"] = ""
+    rec["notification_year_be_last2"] = year_from_no(rec.get("notification_no", ""))
+    return rec
+
+# ---------- Search / paging / detail ----------
+def http_search(sess, kind: str, query: str, yy2: str):
+    """ค้นหา (kind='brand' ค้นจากชื่อการค้า, 'operator' ค้นจากผู้ประกอบการ) แล้วคืนหน้า grid
+    WARM_FORM: ใช้ฟอร์มจากหน้าผลค้นหาครั้งก่อนของ session นี้ (sess.warm_doc) – ฟอร์มหาย/ล้มเหลว = GET หน้าใหม่"""
+    for attempt in range(1, 4):
+        warm = getattr(sess, "warm_doc", None) if WARM_FORM else None
+        sess.warm_doc = None  # ล้มกลางทาง = รอบถัดไปเริ่มจากหน้าใหม่
+        try:
+            doc = warm if warm is not None else http_get(sess, URL)
+            op, yy = _by_id(doc, "ContentPlaceHolder1_txt_oper"), _by_id(doc, "ContentPlaceHolder1_Txt_fdpdtno")
+            br, btn = _brand_input(doc), _by_id(doc, "ContentPlaceHolder1_btn_sea_cmt")
+            if op is None or yy is None or btn is None or (kind == "brand" and br is None):
+                raise RuntimeError("ฟอร์มค้นหาไม่ครบ")
+            data = {op.get("name"): "", yy.get("name"): yy2}
+            if br is not None and br.get("name"): data[br.get("name")] = ""
+            data[(br if kind == "brand" else op).get("name")] = query
+            data.update(_click_data(btn))
+            grid = http_post(sess, doc, data)
+            if _by_id(grid, "ContentPlaceHolder1_btn_sea_cmt") is None:
+                raise RuntimeError("ไม่ได้หน้าผลค้นหา (session หมดอายุ?)")
+            log(f"  -> โหลดตารางแล้ว {len(grid_rows(grid))} แถว ({kind} '{query}', ปี {yy2 or 'รวมทุกปี'}{', ฟอร์มเดิม' if warm is not None else ''})")
+            grid = http_page_size(sess, grid)
+            if NEWEST_FIRST: grid = http_sort_desc(sess, grid)
+            sess.warm_doc = grid
+            return grid
+        except (requests.RequestException, RuntimeError) as e:
+            log(f"[http_search] attempt {attempt}: {e}")
+    raise RuntimeError(f"ค้นหาไม่สำเร็จหลายครั้ง ({kind}): {query} (ปี {yy2 or 'รวมทุกปี'})")
+
+def grid_unique_id(doc) -> str:
+    """UniqueID ของ RadGrid จากสคริปต์ $create(Telerik.Web.UI.RadGrid, {...}) – ไม่พบ = ''"""
+    for js in doc.xpath("//script/text()"):
+        m = GRID_UID_RE.search(js)
+        if m: return m.group(1)
+    return ""
+
+def http_page_size(sess, grid, size: int = PAGE_SIZE):
+    """ตั้งแถวต่อหน้า = size ด้วย postback เดียวกับ tableView.set_pageSize() (FireCommand PageSize ของ MasterTableView)
+    มีหน้าเดียวอยู่แล้ว / หา grid ไม่พบ / เว็บไม่ยอม -> คืน grid เดิม (ไล่หน้าขนาดเดิมต่อ)"""
+    if size <= 0 or not grid.xpath(NEXT_XP) or len(grid_rows(grid)) >= size: return grid  # หน้าเดียว / ขนาดนี้อยู่แล้ว (ฟอร์มเดิม)
+    uid = grid_unique_id(grid)
+    if not uid:
+        log("  -> หา UniqueID ของ RadGrid ไม่พบ -> ใช้ขนาดหน้าเดิม"); return grid
+    before = len(grid_rows(grid))
+    try: doc = http_post(sess, grid, {"__EVENTTARGET": uid, "__EVENTARGUMENT": f"FireCommand:{uid}$ctl00;PageSize;{size}"})
+    except requests.RequestException as e:
+        log(f"  -> ตั้งขนาดหน้าไม่สำเร็จ ({e}) -> ใช้ขนาดหน้าเดิม"); return grid
+    if len(grid_rows(doc)) <= before:
+        log(f"  -> เว็บไม่รับขนาดหน้า {size} -> ใช้ขนาดหน้าเดิม ({before} แถว)"); return grid
+    log(f"  -> ขนาดหน้า {size} แถว: {len(grid_rows(doc))} แถวในหน้าแรก, ทั้งหมด {page_count(doc) or '?'} หน้า")
+    return doc
+
+def pick_sort_field(headers: List[Tuple[str, str]]) -> str:
+    """[(ข้อความหัวคอลัมน์, onclick)] -> sort expression ของคอลัมน์แรกใน SORT_HEADERS ที่เรียงได้ ('' = ไม่มี)"""
+    if SORT_FIELD: return SORT_FIELD
+    fields = {}
+    for text, onclick in headers:
+        m = GRID_SORT_RE.search(onclick or "")
+        if m: fields.setdefault(" ".join((text or "").split()), m.group(1))
+    return next((fields[h] for h in SORT_HEADERS if h in fields), "")
+
+def sorted_desc(doc) -> bool:
+    return bool(doc.xpath(SORTED_DESC_XP))
+
+def http_sort_desc(sess, grid):
+    """เรียงผลใหม่สุดก่อนด้วย postback เดียวกับ tableView.sort('<field> DESC') (FireCommand Sort ของ MasterTableView)
+    หน้าเดียว / เรียงอยู่แล้ว (ฟอร์มเดิม) / หาคอลัมน์ไม่พบ / เว็บไม่ยอม -> คืน grid เดิม (ลำดับเดิมของเว็บ)"""
+    if not grid.xpath(NEXT_XP) or sorted_desc(grid): return grid
+    uid = grid_unique_id(grid)
+    field = pick_sort_field([(_text(a), a.get("onclick", "")) for a in grid.xpath(HEADER_LINK_XP)])
+    if not uid or not field:
+        log("  -> หาคอลัมน์ที่เรียงได้ไม่พบ -> ใช้ลำดับเดิมของเว็บ"); return grid
+    try: doc = http_post(sess, grid, {"__EVENTTARGET": uid, "__EVENTARGUMENT": f"FireCommand:{uid}$ctl00;Sort;{field} DESC"})
+    except requests.RequestException as e:
+        log(f"  -> เรียงผลไม่สำเร็จ ({e}) -> ใช้ลำดับเดิมของเว็บ"); return grid
+    if not doc.xpath(ROWS_XP) or not sorted_desc(doc):
+        log(f"  -> เว็บไม่เรียงตาม {field} -> ใช้ลำดับเดิมของเว็บ"); return grid
+    log(f"  -> เรียงตาม {field} ใหม่สุดก่อน")
+    return doc
+
+def http_next(sess, grid):
+    btns = grid.xpath(NEXT_XP)
+    if not btns: return None
+    before = page_val(grid)
+    nxt = http_post(sess, grid, _click_data(btns[0]))
+    if not nxt.xpath(ROWS_XP) or (before and page_val(nxt) == before): return None
+    log(f"  -> ไปหน้า {page_val(nxt)} แล้ว")
+    return nxt
+
+PAGER_INFO_XP = "//*[contains(@class,'rgInfoPart')]"
+PAGES_RES = [re.compile(r"in\s+(\d+)\s+pages?", re.I), re.compile(r"ใน\s*(\d+)\s*หน้า"), re.compile(r"\bof\s+(\d+)\b", re.I)]
+ITEMS_RES = [re.compile(r"(\d+)\s+items?\b", re.I), re.compile(r"(\d+)\s*รายการ")]
+
+def pager_value(texts, rxs) -> int:
+    """ตัวเลขแรกที่ rxs จับได้จากข้อความ pager (ใช้ทั้ง lxml และ Selenium) – 0 = ไม่ทราบ"""
+    for t in texts:
+        for rx in rxs:
+            m = rx.search(t or "")
+            if m: return int(m.group(1))
+    return 0
+
+def page_count(doc) -> int:
+    return pager_value((_text(el) for el in doc.xpath(PAGER_INFO_XP)), PAGES_RES)
+
+def result_count(doc) -> int:
+    """จำนวนผลทั้งหมดจาก pager ('N items in M pages') – 0 = ไม่ทราบ"""
+    return pager_value((_text(el) for el in doc.xpath(PAGER_INFO_XP)), ITEMS_RES)
+
+def http_goto(sess, grid, k: int):
+    """กระโดดไปหน้า k (ลิงก์ตัวเลข หรือช่อง rgCurrentPage + ปุ่ม Go) – ไม่มีทั้งคู่ = กด next ทีละหน้า"""
+    if k <= 1 or page_val(grid) == str(k): return grid
+    links = grid.xpath(f"//*[contains(@class,'rgNumPart')]//a[normalize-space(.)='{k}']")
+    boxes = grid.xpath("//input[contains(@class,'rgCurrentPage')]")
+    gos = boxes[0].xpath("following::input[(@type='submit' or @type='button') and (contains(@class,'rgPagerButton') or @value='Go')][1]") if boxes else []
+    extra = _click_data(links[0]) if links else {}
+    if not extra and boxes and gos and boxes[0].get("name"):
+        extra = {boxes[0].get("name"): str(k)}; extra.update(_click_data(gos[0]))
+    if extra:
+        doc = http_post(sess, grid, extra)
+        if doc.xpath(ROWS_XP) and page_val(doc) in (str(k), ""):
+            log(f"  -> กระโดดไปหน้า {k} แล้ว"); return doc
+    while grid is not None and page_val(grid) != str(k):
+        grid = http_next(sess, grid)
+    return grid
+
+def http_detail(sess, state: Tuple[str, Dict[str, str]], target: str, arg: str) -> Dict[str, str]:
+    """ยิง postback 'ดูข้อมูล' จาก state ของหน้า grid (ไม่ต้อง back กลับ เพราะ grid ยังอยู่ในมือ)"""
+    doc = post_state(sess, state, {"__EVENTTARGET": target, "__EVENTARGUMENT": arg})
+    if _by_id(doc, "ContentPlaceHolder1_lb_no_regnos") is None:
+        m = WINDOW_OPEN_RE.search(" ".join(doc.xpath("//script/text()")))
+        if m: doc = http_get(sess, urljoin(doc.base_url, m.group(1)))
+    if _by_id(doc, "ContentPlaceHolder1_lb_no_regnos") is None:
+        raise DetailOpenError(f"ไม่พบ lb_no_regnos หลัง postback {target}")
+    return detail_record(doc)
+
+async def _fetch_details(sess, state, rows: List[Dict[str, str]], limit: int) -> List[Optional[Dict]]:
+    sems: Dict[str, asyncio.Semaphore] = {}
+    n = len(rows)
+
+    async def one(i: int, row: Dict[str, str]) -> Optional[Dict]:
+        sem = sems.setdefault(urlsplit(state[0]).netloc, asyncio.Semaphore(max(1, limit)))
+        async with sem:
+            log(f"  -> CLICK ดูข้อมูล | เลขจดแจ้ง={row['notification_no']} | row={i}/{n}")
+            try:
+                rec = await asyncio.to_thread(http_detail, sess, state, row["target"], row["argument"])
+            except (DetailOpenError, requests.RequestException) as e:
+                log(f"     ! เปิดรายละเอียดไม่สำเร็จ (ข้าม): {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+                return None
+        log(f"     ✓ ดึงแล้ว: {rec.get('notification_no','')}")
+        return rec
+
+    return await asyncio.gather(*(one(i, r) for i, r in enumerate(rows, 1)))
+
+def fetch_details(sess, state, rows: List[Dict[str, str]], limit: int = DETAIL_CONCURRENCY) -> List[Optional[Dict]]:
+    """ดึงรายละเอียดทุกแถวพร้อมกัน (จำกัดด้วย semaphore ต่อ host) – ผลลัพธ์เรียงตามแถวของ grid, แถวที่พลาด = None"""
+    if not rows: return []
+    return asyncio.run(_fetch_details(sess, state, rows, limit))
+
+def page_nos(grid, yy2: str, allow_yy) -> List[str]:
+    """เลขจดแจ้งของหน้านี้ที่อยู่ในปีที่ต้องการ (ตามลำดับแถว)"""
+    return [r["notification_no"] for r in grid_rows(grid) if r["notification_no"] and year_ok(r["notification_no"], yy2, allow_yy)]
+
+def scrape_grid_page(sess, grid, yy2: str, allow_yy, limit: int = DETAIL_CONCURRENCY,
+                     known: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """known = record ที่มีอยู่แล้ว (เลขจดแจ้งที่เคยเห็น) – แถวเหล่านี้ไม่ต้องยิง detail; record ที่ดึงใหม่ถูกเพิ่มลง known ด้วย"""
+    if known is None: known = {}
+    todo = [r for r in grid_rows(grid) if r["notification_no"] and year_ok(r["notification_no"], yy2, allow_yy) and r["target"]]
+    fresh = [r for r in todo if r["notification_no"] not in known]
+    if len(todo) > len(fresh): log(f"     ↺ ใช้ record ในเครื่อง {len(todo) - len(fresh)} แถว (เคยเห็นแล้ว)")
+    got = fetch_details(sess, grid_state(grid), fresh, limit)
+    for rec in got:
+        if rec and rec.get("notification_no"): known[rec["notification_no"]] = dict(rec)
+    it, fresh_nos = iter(got), {r["notification_no"] for r in fresh}
+    recs = [next(it) if r["notification_no"] in fresh_nos else dict(known[r["notification_no"]]) for r in todo]
+    return [rec for rec in recs if rec and year_from_no(rec.get("notification_no", "")) in allow_yy]
+
+def scrape_query_pages(sess, kind: str, query: str, yy2: str, first: int, last: Optional[int], allow_yy,
+                       limit: int = DETAIL_CONCURRENCY, known: Optional[Dict[str, Dict]] = None, on_page=None,
+                       result_cap: int = 0, fingerprint=None, stop_known=None) -> List[Dict]:
+    """เฉพาะช่วงหน้า first..last (last=None = จนหน้าสุดท้าย) ของการค้นหาปี yy2 (yy2 = "" ค้นรวมทุกปีใน allow_yy)
+    on_page(page, records, end) ถูกเรียกทุกหน้าที่เสร็จ (end = ไม่มีหน้าถัดไปแล้ว) – ใช้เขียน checkpoint
+    ค้นรวมแล้วผลถึง result_cap (>0) -> ResultCapped ก่อนดึงหน้าใด ๆ
+    fingerprint(จำนวนผล, เลขจดแจ้งหน้าแรก) คืน records เดิม = ผลไม่เปลี่ยน ไม่ต้องไล่หน้า/ยิง detail (None = ดึงตามปกติ)
+    stop_known(หน้า, เลขจดแจ้งในหน้า) = True -> หยุดก่อนดึงหน้านั้น (ใช้เฉพาะเมื่อ grid เรียงใหม่สุดก่อนจริง)"""
+    results: List[Dict] = []
+    grid = http_search(sess, kind, query, yy2)
+    if not yy2 and result_cap and result_count(grid) >= result_cap: raise ResultCapped(result_count(grid))
+    if fingerprint is not None and first <= 1:
+        same = fingerprint(result_count(grid), page_nos(grid, yy2, allow_yy))
+        if same is not None: return same
+    grid = http_goto(sess, grid, first)
+    page = first
+    while grid is not None:
+        if stop_known is not None and sorted_desc(grid) and stop_known(page, page_nos(grid, yy2, allow_yy)):
+            if on_page: on_page(page, [], True)
+            break
+        recs = scrape_grid_page(sess, grid, yy2, allow_yy, limit, known)
+        results.extend(recs)
+        at_last = bool(last and page >= last)
+        nxt = None if at_last else http_next(sess, grid)
+        if on_page: on_page(page, recs, nxt is None and not at_last)
+        grid = nxt; page += 1
+    return results
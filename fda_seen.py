@@ -0,0 +1,60 @@
+# fda_seen.py – ดัชนี "เคยเห็นแล้ว" (ชื่อผู้ประกอบการ / เลขจดแจ้ง) บน SQLite แทน _*_seen.json
+# -*- coding: utf-8 -*-
+# เช็กว่าเคยเห็นด้วย primary key ไม่ต้องโหลดทั้งชุดเข้าหน่วยความจำ; เพิ่มเฉพาะค่าใหม่ใน transaction เดียว (ล่มกลางทาง = ไม่เสียของเดิม)
+import os, json, sqlite3
+from datetime import datetime
+from typing import Iterable, Set
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS seen (value TEXT PRIMARY KEY, first_seen TEXT NOT NULL) WITHOUT ROWID"
+CHUNK = 500  # จำนวนค่าต่อคำสั่ง IN (...) (ต่ำกว่าเพดานตัวแปรของ SQLite)
+
+class SeenIndex:
+    """set แบบถาวร: `v in idx`, len(idx), idx.missing(values), idx.add(values)
+    json_path = ไฟล์ JSON แบบเดิม – ถ้าดัชนียังว่างจะ import ให้ครั้งเดียว (ไฟล์เดิมไม่ถูกแก้)"""
+    def __init__(self, path: str, json_path: str = ""):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        if json_path and len(self) == 0 and os.path.isfile(json_path):
+            self.migrate_json(json_path)
+
+    def migrate_json(self, json_path: str) -> int:
+        try:
+            with open(json_path, "r", encoding="utf-8") as f: values = json.load(f)
+        except Exception: return 0
+        return self.add(values)
+
+    def __contains__(self, v) -> bool:
+        return self.conn.execute("SELECT 1 FROM seen WHERE value = ?", (v,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def __iter__(self):
+        return (v for (v,) in self.conn.execute("SELECT value FROM seen"))
+
+    def missing(self, values: Iterable[str]) -> Set[str]:
+        """ค่าที่ยังไม่เคยเห็น (ถามทีละ CHUNK ค่า)"""
+        values = list(dict.fromkeys(v for v in values if v))
+        found = set()
+        for i in range(0, len(values), CHUNK):
+            part = values[i:i + CHUNK]
+            q = f"SELECT value FROM seen WHERE value IN ({','.join('?' * len(part))})"
+            found.update(v for (v,) in self.conn.execute(q, part))
+        return set(values) - found
+
+    def add(self, values: Iterable[str]) -> int:
+        """เพิ่มเฉพาะค่าที่ยังไม่มี – คืนจำนวนที่เพิ่มจริง"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        before = self.conn.total_changes
+        with self.conn:  # commit ครั้งเดียว / rollback ทั้งชุดถ้าล้ม
+            self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", ((v, today) for v in values if v))
+        return self.conn.total_changes - before
+
+    def close(self):
+        self.conn.close()
+
+def open_seen(json_path: str) -> SeenIndex:
+    """<ชื่อ>.json (แบบเดิม) -> ดัชนี <ชื่อ>.sqlite ข้างกัน (ย้ายข้อมูลให้อัตโนมัติครั้งแรก)"""
+    return SeenIndex(os.path.splitext(json_path)[0] + ".sqlite", json_path)
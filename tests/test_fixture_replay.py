@@ -0,0 +1,27 @@
+# test_fixture_replay.py – ไล่หน้า + ดึงรายละเอียดผ่าน HTTP จาก fixture ที่บันทึกไว้ (ไม่ต่อเว็บจริง)
+# -*- coding: utf-8 -*-
+# fixtures/brand_x = บันทึกด้วย FDA_RECORD_DIR (FDA_PAGE_SIZE=0, 3 แถวต่อหน้า): ค้นยี่ห้อ "brand x" ปี 68 -> 3 หน้า 8 รายการ
+#   python -m pytest -q tests
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fda_http
+import fda_fixture_server
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "brand_x")
+
+def test_replay_brand_pages(monkeypatch):
+    srv = fda_fixture_server.serve(FIXTURES, background=True)
+    try:
+        monkeypatch.setattr(fda_http, "URL", f"http://127.0.0.1:{srv.server_address[1]}/FDA_SEARCH_CENTER/PRODUCT/FRM_SEARCH_CMT.aspx")
+        monkeypatch.setattr(fda_http, "PAGE_SIZE", 0)  # ตอนบันทึกไม่ได้ resize grid
+        monkeypatch.setattr(fda_http, "RECORD_DIR", "")
+        pages = []
+        rows = fda_http.scrape_query_pages(fda_http.new_session(), "brand", "brand x", "68", 1, None, {"68"}, limit=1,
+                                           on_page=lambda page, recs, end: pages.append((page, len(recs), end)))
+    finally:
+        srv.shutdown(); srv.server_close()
+    assert len(rows) == 8
+    assert pages == [(1, 3, False), (2, 3, False), (3, 2, True)]
+    assert sorted(r["notification_no"] for r in rows) == [f"10-1-68000000{i:02d}" for i in range(1, 9)]
+    assert all(r["trade_name"].startswith("BRAND X") for r in rows)